@@ -1,7 +1,11 @@
-import os, json, tempfile, argparse, shutil, mimetypes
-import requests
+import os, sys, time, json, tempfile, argparse, shutil, mimetypes, mmap, struct, hashlib, threading, zlib, subprocess, sqlite3, queue
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse, quote
 
+# Shared keep-alive sessions (per-host pooling, strict timeouts)
+from http_sessions import get_session
+
 # Try to import SDK; otherwise use REST
 USE_AIRTABLE_SDK = False
 try:
@@ -17,13 +21,264 @@ except Exception:
     # Fallback: minimal PIL-based compositor
     from PIL import Image
 
-    def process_single_logo(info, products_dir, output_dir, pdf_output_dir, preview_output_dir, mockup_config, logos_dir):
+    try:
+        import numpy as np
+        NUMPY_AVAILABLE = True
+    except ImportError:
+        # PNG mockups fall back to a full-frame Pillow encode
+        NUMPY_AVAILABLE = False
+
+    PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+    PNG_STRIP_ROWS = 64
+    PNG_STRIP_LEVEL = 6
+
+    def png_chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    def adler32_combine(adler1, adler2, len2):
+        """Adler-32 of A+B from adler32(A), adler32(B) and len(B) (zlib's adler32_combine)."""
+        base = 65521
+        rem = len2 % base
+        sum1 = adler1 & 0xFFFF
+        sum2 = (rem * sum1) % base
+        sum1 = (sum1 + (adler2 & 0xFFFF) + base - 1) % base
+        sum2 = (sum2 + (adler1 >> 16) + (adler2 >> 16) + base - rem) % base
+        return sum1 | (sum2 << 16)
+
+    class StripPNG:
+        """
+        An RGBA image pre-encoded as PNG image data in independently deflated strips of
+        strip_rows rows. Each strip starts with a Sub-filtered row and full-flushes the
+        deflate stream, so write() can re-encode just the strips a logo lands on and
+        copy every other strip's compressed bytes verbatim.
+        """
+
+        def __init__(self, img, strip_rows=PNG_STRIP_ROWS, level=PNG_STRIP_LEVEL):
+            self.width, self.height = img.size
+            self.strip_rows = strip_rows
+            self.level = level
+            self.icc_profile = img.info.get("icc_profile")
+            self.strips = [self._deflate(img.crop((0, top, self.width, min(self.height, top + strip_rows))))
+                           for top in range(0, self.height, strip_rows)]
+            self.nbytes = sum(len(data) for data, _, _ in self.strips)
+
+        def span(self, top, bottom):
+            """Strip-aligned (top, bottom) rows covering top..bottom."""
+            top = max(0, min(top, self.height - 1))
+            bottom = max(top + 1, min(bottom, self.height))
+            first = top // self.strip_rows
+            last = (bottom - 1) // self.strip_rows
+            return first * self.strip_rows, min(self.height, (last + 1) * self.strip_rows)
+
+        def _deflate(self, band):
+            """(raw deflate bytes, adler32, length) of one strip's filtered scanlines."""
+            rows = np.frombuffer(band.tobytes(), np.uint8).reshape(band.height, self.width * 4)
+            filtered = np.empty((band.height, self.width * 4 + 1), np.uint8)
+            filtered[:, 0] = 2                       # Up
+            filtered[1:, 1:] = rows[1:] - rows[:-1]
+            filtered[0, 0] = 1                       # Sub: the first row never looks outside its strip
+            filtered[0, 1:5] = rows[0, :4]
+            filtered[0, 5:] = rows[0, 4:] - rows[0, :-4]
+            data = filtered.tobytes()
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+            return compressor.compress(data) + compressor.flush(zlib.Z_FULL_FLUSH), zlib.adler32(data), len(data)
+
+        def write(self, path, band, band_top):
+            """Write the image as PNG with rows band_top.. replaced by band (a span() of rows)."""
+            first = band_top // self.strip_rows
+            patched = {first + i: self._deflate(band.crop((0, top, self.width, min(band.height, top + self.strip_rows))))
+                       for i, top in enumerate(range(0, band.height, self.strip_rows))}
+            adler = 1
+            parts = [b"\x78\x9c"]
+            for index, strip in enumerate(self.strips):
+                data, strip_adler, length = patched.get(index, strip)
+                parts.append(data)
+                adler = adler32_combine(adler, strip_adler, length)
+            parts.append(b"\x03\x00" + struct.pack(">I", adler))  # empty final block, zlib trailer
+
+            with open(path, "wb") as f:
+                f.write(PNG_SIGNATURE)
+                f.write(png_chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, 6, 0, 0, 0)))
+                if self.icc_profile:
+                    f.write(png_chunk(b"iCCP", b"ICC Profile\0\0" + zlib.compress(self.icc_profile)))
+                f.write(png_chunk(b"IDAT", b"".join(parts)))
+                f.write(png_chunk(b"IEND", b""))
+
+    RAW_MAGIC = b"RGB2"  # files from the old ICC-less layout fail the check and are re-decoded
+    RAW_HEADER = struct.Struct("<4sIII")  # magic, width, height, ICC profile length (profile follows, then pixels)
+
+    class BaseImageCache:
+        """
+        Decoded product images keyed by (path, mtime, size), evicted least-recently-used
+        once max_bytes of RGBA is held. With raw_dir set, each decode is also written as a
+        raw RGBA file that later processes memory-map instead of decoding the PNG again.
+        Cached images are shared and read-only: copy before drawing on them.
+        encoded() adds a StripPNG of the same image so PNG mockups re-encode only a band.
+        """
+
+        def __init__(self, max_bytes=1024 * 1024 * 1024, raw_dir=None, raw_max_bytes=4 * 1024 * 1024 * 1024):
+            self.max_bytes = max_bytes
+            self.raw_dir = raw_dir
+            self.raw_max_bytes = raw_max_bytes
+            self.stats = {"hits": 0, "raw_hits": 0, "misses": 0, "evictions": 0}
+            self._entries = OrderedDict()
+            self._encoded = {}
+            self._bytes = 0
+            self._lock = threading.Lock()
+
+        @staticmethod
+        def key_for(path):
+            st = os.stat(path)
+            return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+        def get(self, path):
+            """Decoded RGBA image for path (raises like Image.open if it can't be read)."""
+            key = self.key_for(path)
+            with self._lock:
+                img = self._entries.get(key)
+                if img is not None:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return img
+
+            img = self._load_raw(key)
+            if img is not None:
+                self.stats["raw_hits"] += 1
+            else:
+                with Image.open(path) as src:
+                    img = src.convert("RGBA")
+                img.readonly = 1
+                self.stats["misses"] += 1
+                self._store_raw(key, img)
+            self._put(key, img)
+            return img
+
+        def encoded(self, path, img=None):
+            """StripPNG of the decoded image at path, built on first use (pass img if get() just returned it)."""
+            key = self.key_for(path)
+            with self._lock:
+                encoded = self._encoded.get(key)
+            if encoded is not None:
+                return encoded
+            encoded = StripPNG(img if img is not None else self.get(path))
+            with self._lock:
+                if key in self._entries and key not in self._encoded:
+                    self._encoded[key] = encoded
+                    self._bytes += encoded.nbytes
+                    self._entries.move_to_end(key)
+                    self._evict()
+            return encoded
+
+        def _put(self, key, img):
+            size = img.width * img.height * 4
+            if size > self.max_bytes:
+                return
+            with self._lock:
+                if key in self._entries:
+                    return
+                # Older mtimes of the same path can never be hit again
+                for stale in [k for k in self._entries if k[0] == key[0]]:
+                    self._drop(stale)
+                self._entries[key] = img
+                self._bytes += size
+                self._evict()
+
+        def _evict(self):
+            # Caller holds the lock
+            while self._bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+        def _drop(self, key):
+            img = self._entries.pop(key)
+            self._bytes -= img.width * img.height * 4
+            encoded = self._encoded.pop(key, None)
+            if encoded is not None:
+                self._bytes -= encoded.nbytes
+
+        def _raw_path(self, key):
+            digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+            return os.path.join(self.raw_dir, digest[:2], digest + ".rgba")
+
+        def _load_raw(self, key):
+            if not self.raw_dir:
+                return None
+            path = self._raw_path(key)
+            try:
+                with open(path, "rb") as f:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                return None
+            try:
+                magic, width, height, icc_length = RAW_HEADER.unpack_from(mm)
+                offset = RAW_HEADER.size + icc_length
+                if magic == RAW_MAGIC and len(mm) == offset + width * height * 4:
+                    os.utime(path)  # recency for pruning
+                    # The image keeps the mapping alive; pages are shared with other processes
+                    img = Image.frombuffer("RGBA", (width, height), memoryview(mm)[offset:], "raw", "RGBA", 0, 1)
+                    if icc_length:
+                        img.info["icc_profile"] = mm[RAW_HEADER.size:offset]
+                    return img
+            except (OSError, ValueError, struct.error):
+                pass
+            mm.close()
+            return None
+
+        def _store_raw(self, key, img):
+            if not self.raw_dir:
+                return
+            path = self._raw_path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                icc_profile = img.info.get("icc_profile") or b""
+                with open(tmp_path, "wb") as f:
+                    f.write(RAW_HEADER.pack(RAW_MAGIC, img.width, img.height, len(icc_profile)))
+                    f.write(icc_profile)
+                    f.write(img.tobytes())
+                os.replace(tmp_path, path)
+                self._prune_raw()
+            except OSError:
+                pass
+
+        def _prune_raw(self):
+            files = []
+            for root, _, names in os.walk(self.raw_dir):
+                for name in names:
+                    if name.endswith(".rgba"):
+                        full = os.path.join(root, name)
+                        st = os.stat(full)
+                        files.append((st.st_mtime, st.st_size, full))
+            total = sum(size for _, size, _ in files)
+            for _, size, full in sorted(files):
+                if total <= self.raw_max_bytes:
+                    break
+                os.remove(full)
+                total -= size
+
+    _base_image_cache = None
+
+    def get_base_image_cache():
+        """Process-wide BaseImageCache sized by $MOCKUP_BASE_CACHE_MB, raw tier in $MOCKUP_BASE_CACHE_DIR."""
+        global _base_image_cache
+        if _base_image_cache is None:
+            max_mb = int(os.environ.get("MOCKUP_BASE_CACHE_MB", 1024))
+            _base_image_cache = BaseImageCache(max_mb * 1024 * 1024, os.environ.get("MOCKUP_BASE_CACHE_DIR") or None)
+        return _base_image_cache
+
+    def process_single_logo(info, products_dir, output_dir, pdf_output_dir, preview_output_dir, mockup_config, logos_dir,
+                            workers=None):
         """
         Minimal fallback compositor:
         - info: (logo_filename, _, _)
         - mockup_config: { image_file: { boxes: [ {x1,y1,x2,y2,name}, ... ] } }
         - Writes composited PNG to output_dir and a preview copy to preview_output_dir
         - If exactly one image_file is targeted, writes output using the original image_file name
+        - Products render on a thread pool (Pillow releases the GIL while decoding, resizing
+          and encoding); workers defaults to $MOCKUP_RENDER_WORKERS or the CPU count
+        - Base images come from the process-wide BaseImageCache, so repeat garments skip decoding
+        - Only the logo box is blended; PNGs reuse the cached base encoding outside its rows
+        - Returns per-product timings in mockup_config order; they are also reported on stderr
         """
         logo_filename = info[0]
         logo_path = os.path.join(logos_dir, logo_filename)
@@ -33,57 +288,108 @@ except Exception:
             raise SystemExit(f"Failed to open logo: {e}")
 
         single_target = len(mockup_config.keys()) == 1
+        os.makedirs(output_dir, exist_ok=True)
+        os.makedirs(preview_output_dir, exist_ok=True)
+
+        def render(item):
+            image_file, cfg = item
+            return _render_mockup(image_file, cfg, logo_img, products_dir, output_dir, preview_output_dir, single_target)
+
+        start = time.time()
+        items = list(mockup_config.items())
+        workers = workers or int(os.environ.get("MOCKUP_RENDER_WORKERS", 0)) or (os.cpu_count() or 1)
+        workers = max(1, min(workers, len(items)))
+        if workers > 1:
+            # map() keeps mockup_config order
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                timings = list(executor.map(render, items))
+        else:
+            timings = [render(item) for item in items]
+
+        # stdout is reserved for the JSON manifest
+        for t in timings:
+            if t:
+                print(f"⏱️  {t['out_name']}: {t['total_s']:.2f}s (decode {t['decode_s']:.2f}s, "
+                      f"composite {t['composite_s']:.2f}s, encode {t['encode_s']:.2f}s)", file=sys.stderr, flush=True)
+        rendered = sum(1 for t in timings if t)
+        cache_stats = get_base_image_cache().stats
+        print(f"⏱️  Rendered {rendered}/{len(items)} mockups in {time.time() - start:.2f}s on {workers} threads "
+              f"(base cache: {cache_stats['hits']} hits, {cache_stats['raw_hits']} raw, {cache_stats['misses']} decodes)",
+              file=sys.stderr, flush=True)
+        return timings
+
+    def _render_mockup(image_file, cfg, logo_img, products_dir, output_dir, preview_output_dir, single_target):
+        """Composite the logo onto one product image. Returns its timings, or None if skipped."""
+        start = time.time()
+        base_path = os.path.join(products_dir, image_file)
+        if not os.path.isfile(base_path):
+            # Try url-quoted fallback path
+            base_path = os.path.join(products_dir, quote(image_file))
+
+        # Use original filename when single target to overwrite placeholder and match UI
+        if single_target:
+            out_name = os.path.basename(image_file)
+        else:
+            out_name = os.path.splitext(os.path.basename(image_file))[0] + "_mockup.png"
+        out_path = os.path.join(output_dir, out_name)
+        is_jpeg = out_name.lower().endswith(('.jpg', '.jpeg'))
 
-        for image_file, cfg in mockup_config.items():
-            base_path = os.path.join(products_dir, image_file)
-            if not os.path.isfile(base_path):
-                # Try url-quoted fallback path
-                base_path = os.path.join(products_dir, quote(image_file))
-            try:
-                base_img = Image.open(base_path).convert("RGBA")
-            except Exception:
-                # Skip this one if base can't be opened
-                continue
-
-            boxes = cfg.get("boxes", [])
-            if not boxes:
-                continue
-            box = boxes[0]
-            x1, y1, x2, y2 = int(box["x1"]), int(box["y1"]), int(box["x2"]), int(box["y2"]) 
-            w, h = max(1, x2 - x1), max(1, y2 - y1)
-
-            # Resize logo preserving aspect ratio to fit within box
-            logo_w, logo_h = logo_img.size
-            scale = min(w / logo_w, h / logo_h)
-            new_size = (max(1, int(logo_w * scale)), max(1, int(logo_h * scale)))
-            logo_resized = logo_img.resize(new_size, Image.LANCZOS)
-
-            # Center inside box
-            offset_x = x1 + max(0, (w - new_size[0]) // 2)
-            offset_y = y1 + max(0, (h - new_size[1]) // 2)
-
-            composite = base_img.copy()
-            composite.alpha_composite(logo_resized, (offset_x, offset_y))
-
-            # Use original filename when single target to overwrite placeholder and match UI
-            if single_target:
-                out_name = os.path.basename(image_file)
+        try:
+            base_img = get_base_image_cache().get(base_path)
+            encoded = get_base_image_cache().encoded(base_path, base_img) if not is_jpeg and NUMPY_AVAILABLE else None
+        except Exception:
+            # Skip this one if base can't be opened
+            return None
+        decoded = time.time()
+
+        boxes = cfg.get("boxes", [])
+        if not boxes:
+            return None
+        box = boxes[0]
+        x1, y1, x2, y2 = int(box["x1"]), int(box["y1"]), int(box["x2"]), int(box["y2"]) 
+        w, h = max(1, x2 - x1), max(1, y2 - y1)
+
+        # Resize logo preserving aspect ratio to fit within box
+        logo_w, logo_h = logo_img.size
+        scale = min(w / logo_w, h / logo_h)
+        new_size = (max(1, int(logo_w * scale)), max(1, int(logo_h * scale)))
+        logo_resized = logo_img.resize(new_size, Image.LANCZOS)
+
+        # Center inside box
+        offset_x = x1 + max(0, (w - new_size[0]) // 2)
+        offset_y = y1 + max(0, (h - new_size[1]) // 2)
+
+        # base_img is shared through the cache: blend only the rows/box the logo covers
+        if encoded is not None:
+            top, bottom = encoded.span(offset_y, offset_y + new_size[1])
+            band = base_img.crop((0, top, base_img.width, bottom))
+            band.alpha_composite(logo_resized, (offset_x, offset_y - top))
+            composited = time.time()
+            encoded.write(out_path, band, top)
+        else:
+            box_rect = (offset_x, offset_y, offset_x + new_size[0], offset_y + new_size[1])
+            region = base_img.crop(box_rect)
+            region.alpha_composite(logo_resized)
+            # The one full-frame buffer is the output itself
+            if is_jpeg:
+                composite = base_img.convert("RGB")
+                composite.paste(region.convert("RGB"), box_rect[:2])
             else:
-                out_name = os.path.splitext(os.path.basename(image_file))[0] + "_mockup.png"
-
-            out_path = os.path.join(output_dir, out_name)
-            os.makedirs(output_dir, exist_ok=True)
-            # Preserve extension based on out_name
-            if out_name.lower().endswith(('.jpg', '.jpeg')):
-                composite.convert("RGB").save(out_path, "JPEG", quality=92)
+                composite = base_img.copy()
+                composite.paste(region, box_rect[:2])
+            composited = time.time()
+            if is_jpeg:
+                composite.save(out_path, "JPEG", quality=92)
             else:
-                composite.convert("RGBA").save(out_path, "PNG")
+                composite.save(out_path, "PNG")
 
-            # Write preview copy
-            os.makedirs(preview_output_dir, exist_ok=True)
-            shutil.copy2(out_path, os.path.join(preview_output_dir, out_name))
+        # Write preview copy
+        shutil.copy2(out_path, os.path.join(preview_output_dir, out_name))
+        done = time.time()
 
-            # Optional: PDF skipped in fallback
+        # Optional: PDF skipped in fallback
+        return {"image_file": image_file, "out_name": out_name, "decode_s": decoded - start,
+                "composite_s": composited - decoded, "encode_s": done - composited, "total_s": done - start}
 
 # Python S3 uploader
 from upload_s3 import upload_folder as upload_folder_to_s3
@@ -99,26 +405,29 @@ def download_logo(logo_url, dest_dir):
     fn = os.path.basename(urlparse(logo_url).path) or "logo.png"
     if '.' not in fn:
         try:
-            head = requests.head(logo_url, timeout=10)
+            head = get_session().head(logo_url, timeout=10)
             ct = head.headers.get('content-type','').split(';')[0]
             ext = mimetypes.guess_extension(ct) or '.png'
         except Exception:
             ext = '.png'
         fn = f"logo{ext}"
     fp = os.path.join(dest_dir, fn)
-    r = requests.get(logo_url, timeout=60)
+    r = get_session().get(logo_url, timeout=60)
     r.raise_for_status()
     with open(fp, "wb") as f:
         f.write(r.content)
     return fp
 
-def airtable_fetch_records_pat(base_id, table_name, pat_token):
+def airtable_fetch_records_pat(base_id, table_name, pat_token, formula=None):
     rows = []
     url = f"https://api.airtable.com/v0/{base_id}/{table_name}"
     headers = {"Authorization": f"Bearer {pat_token}"}
     params = {"pageSize": 100}
+    if formula:
+        params["filterByFormula"] = formula
+    session = get_session()
     while True:
-        resp = requests.get(url, headers=headers, params=params, timeout=30)
+        resp = session.get(url, headers=headers, params=params, timeout=30)
         resp.raise_for_status()
         data = resp.json()
         rows.extend(data.get("records", []))
@@ -145,108 +454,246 @@ def ensure_base_image_local(image_file, preferred_dir, fallback_public_base_url,
         tmp_dir = os.path.join(work_root, 'products')
         ensure_dir(tmp_dir)
         url = f"{fallback_public_base_url.rstrip('/')}/images/products/{quote(image_file)}"
-        r = requests.get(url, timeout=60)
+        r = get_session().get(url, timeout=60)
         r.raise_for_status()
         with open(os.path.join(tmp_dir, image_file), "wb") as f:
             f.write(r.content)
         return tmp_dir
     except Exception as e:
-        print(f"⚠️  Could not download base image {image_file}: {e}", flush=True)
+        print(f"⚠️  Could not download base image {image_file}: {e}", file=sys.stderr, flush=True)
         return preferred_dir
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--email", required=True)
-    ap.add_argument("--logo_url", required=True)
-    ap.add_argument("--products_dir", required=True)
-    ap.add_argument("--product_id", required=False, help="If provided, only generate for this product_id")
-    args = ap.parse_args()
+CATALOG_PATH = os.environ.get("MOCKUP_CATALOG_PATH") or os.path.join(tempfile.gettempdir(), "mockup_catalog.sqlite")
+CATALOG_TTL = int(os.environ.get("MOCKUP_CATALOG_TTL", 900))  # seconds before the catalog asks Airtable for changes
+FALLBACK_CONFIG = os.environ.get("MOCKUP_CONFIG_FALLBACK") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "scripts", "mockup_config_real.json")
 
-    # ENV
+def fetch_records(base_id, table_name, pat_token, formula=None):
+    """Airtable rows of the table, optionally filtered by an Airtable formula."""
+    if USE_AIRTABLE_SDK:
+        at = Airtable(base_id, table_name, pat_token)
+        return at.get_all(formula=formula) if formula else at.get_all()
+    return airtable_fetch_records_pat(base_id, table_name, pat_token, formula)
+
+def catalog_row(rec):
+    """(record_id, product_id, image_file, boxes) for an Airtable record, or None if it can't be mocked up."""
+    fields = rec["fields"] if not USE_AIRTABLE_SDK else rec.get("fields", rec)
+    pid = fields.get("product_id") or fields.get("id")
+    image_file = fields.get("image_file")
+    boxes_raw = fields.get("boxes") or "{}"
+    try:
+        boxes = json.loads(boxes_raw).get("boxes", [])
+    except Exception:
+        boxes = []
+    if not (image_file and boxes):
+        return None
+    return rec.get("id") or f"{pid}:{image_file}", pid, image_file, boxes
+
+class ProductCatalog:
+    """
+    Local SQLite copy of the Airtable product_id / image_file / boxes rows,
+    indexed by product_id, so a mockup run needs no Airtable round-trips.
+
+    refresh() pulls only rows modified since the previous sync (LAST_MODIFIED_TIME()
+    filter) and does a full resync every `full_sync_age` seconds to drop deleted rows.
+    """
+
+    SYNC_SKEW = 60  # seconds of overlap so clock drift can't hide an edit
+
+    def __init__(self, path, max_age=CATALOG_TTL, full_sync_age=24 * 3600, source=None):
+        self.path = path
+        self.max_age = max_age
+        self.full_sync_age = full_sync_age
+        self.source = source
+        self._conn = None
+        self._conn_pid = None
+        self._lock = threading.Lock()
+
+    def _db(self):
+        # Reopen after fork: SQLite connections must not cross processes
+        if self._conn is None or self._conn_pid != os.getpid():
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS products ("
+                "record_id TEXT PRIMARY KEY, product_id TEXT, image_file TEXT, boxes TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS products_by_product_id ON products (product_id)")
+            conn.execute("CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn, self._conn_pid = conn, os.getpid()
+        return self._conn
+
+    def _state(self):
+        with self._lock:
+            return dict(self._db().execute("SELECT key, value FROM sync_state").fetchall())
+
+    def is_stale(self, now=None):
+        state = self._state()
+        if state.get("source") != self.source:
+            return True
+        return (now or time.time()) - float(state.get("last_sync", 0)) > self.max_age
+
+    def mockup_config(self, target_pid=None):
+        """image_file -> { boxes: [...] } for target_pid, or for every product if it's empty."""
+        query = "SELECT image_file, boxes FROM products"
+        params = ()
+        if target_pid:
+            query += " WHERE product_id = ?"
+            params = (target_pid,)
+        with self._lock:
+            rows = self._db().execute(query + " ORDER BY product_id, image_file", params).fetchall()
+        return {image_file: {"boxes": json.loads(boxes)} for image_file, boxes in rows}
+
+    def refresh(self, fetch, now=None):
+        """Apply fetch(formula) -> Airtable records; returns (rows fetched, whether it was a full sync)."""
+        started = now or time.time()
+        state = self._state()
+        full = (state.get("source") != self.source
+                or started - float(state.get("last_full_sync", 0)) > self.full_sync_age)
+        if full:
+            records = fetch(None)
+        else:
+            since = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(float(state["last_sync"]) - self.SYNC_SKEW))
+            records = fetch(f"IS_AFTER(LAST_MODIFIED_TIME(), '{since}')")
+
+        with self._lock:
+            conn = self._db()
+            with conn:
+                if full:
+                    conn.execute("DELETE FROM products")
+                for rec in records:
+                    row = catalog_row(rec)
+                    if row is None:
+                        # Edited so it no longer has an image or boxes
+                        conn.execute("DELETE FROM products WHERE record_id = ?", (rec.get("id"),))
+                        continue
+                    record_id, pid, image_file, boxes = row
+                    conn.execute("INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?)",
+                                 (record_id, pid, image_file, json.dumps(boxes)))
+                synced = {"last_sync": started, "source": self.source}
+                if full:
+                    synced["last_full_sync"] = started
+                conn.executemany("INSERT OR REPLACE INTO sync_state VALUES (?, ?)",
+                                 [(key, str(value)) for key, value in synced.items()])
+        return len(records), full
+
+_catalogs = {}
+
+def get_product_catalog(source):
+    """Per-process ProductCatalog at $MOCKUP_CATALOG_PATH for an Airtable base/table."""
+    catalog = _catalogs.get((source, os.getpid()))
+    if catalog is None:
+        catalog = ProductCatalog(CATALOG_PATH, source=source)
+        _catalogs[(source, os.getpid())] = catalog
+    return catalog
+
+def fallback_mockup_config(target_pid=None, path=FALLBACK_CONFIG):
+    """mockup_config from the checked-in snapshot; a product_id selects image files named <product_id>_*."""
+    try:
+        with open(path) as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {image_file: {"boxes": cfg["boxes"]} for image_file, cfg in config.items()
+            if cfg.get("boxes") and (not target_pid or os.path.basename(image_file).startswith(f"{target_pid}_"))}
+
+def load_mockup_config(target_pid):
+    """
+    mockup_config for a run from the local catalog. Airtable is only asked for
+    changes when the catalog is stale or lacks the product; when it can't be
+    reached the cached catalog, then scripts/mockup_config_real.json, is used.
+    """
     AIRTABLE_PAT     = os.environ.get("AIRTABLE_PAT")
     AIRTABLE_BASE_ID = os.environ.get("AIRTABLE_BASE_ID")
     AIRTABLE_TABLE   = os.environ.get("AIRTABLE_TABLE_NAME", "Products")
+
+    catalog = get_product_catalog(f"{AIRTABLE_BASE_ID}/{AIRTABLE_TABLE}")
+    mockup_config = catalog.mockup_config(target_pid)
+    refreshed = False
+    if not mockup_config or catalog.is_stale():
+        if AIRTABLE_BASE_ID and AIRTABLE_PAT:
+            try:
+                fetched, full = catalog.refresh(
+                    lambda formula: fetch_records(AIRTABLE_BASE_ID, AIRTABLE_TABLE, AIRTABLE_PAT, formula))
+                refreshed = True
+                print(f"📇 Catalog {'full sync' if full else 'update'}: {fetched} Airtable rows", file=sys.stderr, flush=True)
+                mockup_config = catalog.mockup_config(target_pid)
+            except Exception as e:
+                print(f"⚠️  Airtable unreachable, using cached catalog: {e}", file=sys.stderr, flush=True)
+        else:
+            print("⚠️  AIRTABLE_BASE_ID or AIRTABLE_PAT not set, using cached catalog", file=sys.stderr, flush=True)
+
+    if not mockup_config and not refreshed:
+        mockup_config = fallback_mockup_config(target_pid)
+        if mockup_config:
+            print(f"⚠️  Using fallback boxes from {os.path.basename(FALLBACK_CONFIG)}", file=sys.stderr, flush=True)
+    return mockup_config
+
+def run_job(email, logo_url, products_dir, product_id=None):
+    """Generate and upload the mockups for one request and return its manifest."""
+    # ENV
     AWS_BUCKET_NAME  = os.environ.get("AWS_BUCKET_NAME")
     PUBLIC_BASE_URL  = os.environ.get("PUBLIC_BASE_URL")  # used for fallback download
 
-    if not AIRTABLE_BASE_ID or not AIRTABLE_PAT:
-        raise SystemExit("Missing AIRTABLE_BASE_ID or AIRTABLE_PAT")
-
-    # Fetch rows
-    if USE_AIRTABLE_SDK:
-        at = Airtable(AIRTABLE_BASE_ID, AIRTABLE_TABLE, AIRTABLE_PAT)
-        records = at.get_all()
-    else:
-        records = airtable_fetch_records_pat(AIRTABLE_BASE_ID, AIRTABLE_TABLE, AIRTABLE_PAT)
-
-    target_pid = (args.product_id or "").strip()
+    target_pid = (product_id or "").strip()
 
     # Build mockup_config: image_file -> { boxes: [...] }
-    mockup_config = {}
-    for rec in records:
-        fields = rec["fields"] if not USE_AIRTABLE_SDK else rec.get("fields", rec)
-        pid = fields.get("product_id") or fields.get("id")
-        if target_pid and pid != target_pid:
-            continue
-        image_file = fields.get("image_file")
-        boxes_raw = fields.get("boxes") or "{}"
-        try:
-            boxes = json.loads(boxes_raw).get("boxes", [])
-        except Exception:
-            boxes = []
-        if image_file and boxes:
-            mockup_config[image_file] = {"boxes": boxes}
-
+    mockup_config = load_mockup_config(target_pid)
     if not mockup_config:
         raise SystemExit("No products with bounding boxes matched selection in Airtable.")
 
     # Temp work dirs
     work = tempfile.mkdtemp(prefix="mockups_")
-    logos_dir = os.path.join(work, "logos")
-    out_dir   = os.path.join(work, "out")      # PNGs
-    pdf_dir   = os.path.join(work, "pdf")      # PDFs
-    prev_dir  = os.path.join(work, "preview")  # previews
-    ensure_dir(out_dir); ensure_dir(pdf_dir); ensure_dir(prev_dir)
-
-    # Download logo
-    logo_path = download_logo(args.logo_url, logos_dir)
-    info = (os.path.basename(logo_path), 1, 1)
-
-    # If we’re targeting a single product, make sure its base image exists locally (fallback to PUBLIC_BASE_URL)
-    products_dir_for_run = args.products_dir
-    if len(mockup_config.keys()) == 1:
-        image_file = next(iter(mockup_config.keys()))
-        products_dir_for_run = ensure_base_image_local(
-            image_file,
-            args.products_dir,
-            PUBLIC_BASE_URL,
-            work
+    try:
+        logos_dir = os.path.join(work, "logos")
+        out_dir   = os.path.join(work, "out")      # PNGs
+        pdf_dir   = os.path.join(work, "pdf")      # PDFs
+        prev_dir  = os.path.join(work, "preview")  # previews
+        ensure_dir(out_dir); ensure_dir(pdf_dir); ensure_dir(prev_dir)
+
+        # Download logo
+        logo_path = download_logo(logo_url, logos_dir)
+        info = (os.path.basename(logo_path), 1, 1)
+
+        # If we’re targeting a single product, make sure its base image exists locally (fallback to PUBLIC_BASE_URL)
+        products_dir_for_run = products_dir
+        if len(mockup_config.keys()) == 1:
+            image_file = next(iter(mockup_config.keys()))
+            products_dir_for_run = ensure_base_image_local(
+                image_file,
+                products_dir,
+                PUBLIC_BASE_URL,
+                work
+            )
+
+        # Generate
+        _ = process_single_logo(
+            info,
+            products_dir=products_dir_for_run,
+            output_dir=out_dir,
+            pdf_output_dir=pdf_dir,
+            preview_output_dir=prev_dir,
+            mockup_config=mockup_config,
+            logos_dir=logos_dir
         )
 
-    # Generate
-    _ = process_single_logo(
-        info,
-        products_dir=products_dir_for_run,
-        output_dir=out_dir,
-        pdf_output_dir=pdf_dir,
-        preview_output_dir=prev_dir,
-        mockup_config=mockup_config,
-        logos_dir=logos_dir
-    )
-
-    # Upload to S3 under <email>/mockups/*
-    email_folder = args.email.lower().replace("@","_at_").replace(".","_dot_")
-    s3_prefix = f"{email_folder}/mockups"
-
-    uploaded_png, uploaded_pdf, uploaded_prev = [], [], []
-    if AWS_BUCKET_NAME:
-        uploaded_png  = upload_folder_to_s3(out_dir,  s3_prefix)
-        uploaded_pdf  = upload_folder_to_s3(pdf_dir,  s3_prefix)
-        uploaded_prev = upload_folder_to_s3(prev_dir, s3_prefix)
+        # Upload to S3 under <email>/mockups/*
+        email_folder = email.lower().replace("@","_at_").replace(".","_dot_")
+        s3_prefix = f"{email_folder}/mockups"
+
+        uploaded_png, uploaded_pdf, uploaded_prev = [], [], []
+        if AWS_BUCKET_NAME:
+            uploaded_png  = upload_folder_to_s3(out_dir,  s3_prefix)
+            uploaded_pdf  = upload_folder_to_s3(pdf_dir,  s3_prefix)
+            uploaded_prev = upload_folder_to_s3(prev_dir, s3_prefix)
+    finally:
+        # Cleanup
+        shutil.rmtree(work, ignore_errors=True)
 
-    # Emit pure JSON manifest on stdout (server.js reads this)
     manifest = {
-        "email": args.email,
+        "email": email,
         "product_id": target_pid or None,
         "s3_prefix": s3_prefix,
         "product_map": {}
@@ -257,11 +704,131 @@ def main():
             "pdf_urls": uploaded_pdf,
             "preview_urls": uploaded_prev
         }
+    return manifest
 
-    print(json.dumps(manifest), flush=True)
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def serve(default_products_dir=None):
+    """
+    Persistent worker: one JSON job per stdin line, one JSON reply per stdout line.
+    Job:   {"id", "email", "logo_url", "products_dir"?, "product_id"?}
+    Reply: {"id", "ok": true, "manifest": {...}, "elapsed_s"} or {"id", "ok": false, "error", "elapsed_s"}
+    HTTP sessions, the S3 client, the product catalog and decoded base images stay warm between jobs.
+    Jobs run one at a time; concurrency comes from running several workers (server.js keeps a pool).
+    """
+    replies = sys.stdout
+    sys.stdout = sys.stderr  # nothing but replies may reach the real stdout
+    latencies = deque(maxlen=1000)
+    print(f"🚀 Mockup worker ready (pid {os.getpid()})", file=sys.stderr, flush=True)
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        start = time.time()
+        job_id = None
+        try:
+            job = json.loads(line)
+            job_id = job.get("id")
+            manifest = run_job(job["email"], job["logo_url"], job.get("products_dir") or default_products_dir,
+                               job.get("product_id"))
+            reply = {"id": job_id, "ok": True, "manifest": manifest}
+        except (Exception, SystemExit) as e:
+            reply = {"id": job_id, "ok": False, "error": str(e) or e.__class__.__name__}
+        elapsed = time.time() - start
+        reply["elapsed_s"] = round(elapsed, 3)
+        replies.write(json.dumps(reply) + "\n")
+        replies.flush()
+        if not reply["ok"]:
+            print(f"❌ Job {job_id} failed: {reply['error']}", file=sys.stderr, flush=True)
+            continue
+        latencies.append(elapsed)
+        print(f"⏱️  Job {job_id}: {elapsed:.2f}s (p50 {percentile(latencies, 50):.2f}s, "
+              f"p99 {percentile(latencies, 99):.2f}s over {len(latencies)} jobs)", file=sys.stderr, flush=True)
+
+def bench(args, runs, concurrency=1, workers=None):
+    """
+    Time `runs` identical requests from `concurrency` clients at once, spawned one
+    process each vs. sent to a pool of `workers` --serve processes ($MOCKUP_WORKERS,
+    like server.js). A worker runs one job at a time, so with more clients than
+    workers the queueing shows up in the worker latencies.
+    """
+    script = [sys.executable, os.path.abspath(__file__)]
+    job_args = ["--email", args.email, "--logo_url", args.logo_url, "--products_dir", args.products_dir]
+    if args.product_id:
+        job_args += ["--product_id", args.product_id]
+    workers = workers or int(os.environ.get("MOCKUP_WORKERS", 2))
+
+    def spawn_one(_):
+        start = time.time()
+        subprocess.run(script + job_args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        return time.time() - start
+
+    # Includes each worker's first (cold) job, as a freshly started service would see it
+    job = {"email": args.email, "logo_url": args.logo_url, "products_dir": args.products_dir,
+           "product_id": args.product_id}
+    pool = [subprocess.Popen(script + ["--serve"], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                             stderr=subprocess.DEVNULL, text=True) for _ in range(workers)]
+    idle = queue.Queue()
+    for worker in pool:
+        idle.put(worker)
+
+    def worker_one(i):
+        start = time.time()
+        worker = idle.get()
+        try:
+            worker.stdin.write(json.dumps(dict(job, id=i)) + "\n")
+            worker.stdin.flush()
+            reply = json.loads(worker.stdout.readline())
+        finally:
+            idle.put(worker)
+        if not reply.get("ok"):
+            raise SystemExit(f"Worker job failed: {reply.get('error')}")
+        return time.time() - start
+
+    report = {}
+    try:
+        for mode, one in (("spawn", spawn_one), ("worker", worker_one)):
+            start = time.time()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                times = list(executor.map(one, range(runs)))
+            wall = time.time() - start
+            report[mode] = {"runs": runs, "concurrency": concurrency, "p50_s": round(percentile(times, 50), 3),
+                            "p99_s": round(percentile(times, 99), 3), "requests_per_s": round(runs / wall, 2)}
+        report["worker"]["workers"] = workers
+    finally:
+        for worker in pool:
+            worker.stdin.close()
+            worker.wait()
+    return report
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--email")
+    ap.add_argument("--logo_url")
+    ap.add_argument("--products_dir")
+    ap.add_argument("--product_id", required=False, help="If provided, only generate for this product_id")
+    ap.add_argument("--serve", action="store_true",
+                    help="Run as a persistent worker reading JSON jobs from stdin (see serve())")
+    ap.add_argument("--bench", type=int, metavar="N",
+                    help="Compare p50/p99 latency of N spawned runs vs. N jobs on a pool of --serve workers")
+    ap.add_argument("--concurrency", type=int, default=1, metavar="C",
+                    help="Requests in flight at once during --bench")
+    args = ap.parse_args()
 
-    # Cleanup
-    shutil.rmtree(work, ignore_errors=True)
+    if args.serve:
+        serve(args.products_dir)
+        return
+    if not (args.email and args.logo_url and args.products_dir):
+        ap.error("--email, --logo_url and --products_dir are required")
+    if args.bench:
+        print(json.dumps(bench(args, args.bench, max(1, args.concurrency))), flush=True)
+        return
+
+    manifest = run_job(args.email, args.logo_url, args.products_dir, args.product_id)
+
+    # Emit pure JSON manifest on stdout (server.js reads this)
+    print(json.dumps(manifest), flush=True)
 
 if __name__ == "__main__":
     main()
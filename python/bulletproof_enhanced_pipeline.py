@@ -13,14 +13,20 @@ This pipeline builds on the bulletproof scraper foundation and adds:
 8. Modular service architecture
 """
 
+import io
 import os
 import sys
 import time
 import json
+import sqlite3
+import hashlib
+import shutil
+import threading
 import socket
 import signal
 import multiprocessing
 from multiprocessing import Process, Queue
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse, urljoin
 from dataclasses import dataclass, asdict
 from typing import Dict, List, Optional, Tuple, Any
@@ -35,7 +41,7 @@ except ImportError:
     sys.exit(1)
 
 try:
-    from PIL import Image, ImageStat, ImageChops, ImageFilter
+    from PIL import Image, ImageFilter
 except ImportError:
     print("❌ Pillow not found. Install with: pip install Pillow")
     sys.exit(1)
@@ -54,17 +60,32 @@ except ImportError:
 
 # Optional AI dependencies
 try:
-    from rembg import remove as rembg_remove
+    from rembg import remove as rembg_remove, new_session as rembg_new_session
     REMBG_AVAILABLE = True
 except ImportError:
     print("⚠️ rembg not available. Background removal will use fallback method. Install with: pip install rembg")
     REMBG_AVAILABLE = False
     rembg_remove = None
+    rembg_new_session = None
+
+# Optional SVG rasterizer for vector logos saved by the scraper
+try:
+    import cairosvg
+    CAIROSVG_AVAILABLE = True
+except ImportError:
+    cairosvg = None
+    CAIROSVG_AVAILABLE = False
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Below this effective PPI at the target size a logo is rejected outright
+MIN_PRODUCTION_PPI = 50
+
+# zlib levels for output PNGs
+PNG_COMPRESS_LEVELS = {"proof": 1, "default": 6, "archive": 9}
+
 class PrintMethod(Enum):
     DTF = "DTF"
     DTG = "DTG" 
@@ -97,6 +118,7 @@ class JobManifest:
                 "vectorize_if_flat": True,
                 "min_stroke_pt": 0.75,
                 "underbase_choke_pt": 0.75,
+                "underbase_choke_shape": "disk",  # or "square" (matches the old MinFilter passes)
                 "color_merge_delta_e": 1.5,
                 "max_colors_screen": 6,
                 "auto_remove_shadows": True
@@ -118,12 +140,304 @@ class LogoAnalysis:
     recommended_path: str  # "vector" or "raster"
     quality_issues: List[str]
 
+# rembg sessions (ONNX model loaded into memory), one per model per process
+_rembg_sessions = {}
+BG_REMOVAL_STATS = {"cold_start_s": 0.0, "calls": 0, "total_s": 0.0}
+
+def get_rembg_session(model_name: str = "u2net"):
+    """Return this process's rembg session for model_name, loading it on first use."""
+    key = (model_name, os.getpid())
+    session = _rembg_sessions.get(key)
+    if session is None:
+        start_time = time.time()
+        session = rembg_new_session(model_name)
+        _rembg_sessions[key] = session
+        BG_REMOVAL_STATS["cold_start_s"] += time.time() - start_time
+        logger.info(f"🧠 Loaded rembg model {model_name} in {time.time() - start_time:.2f}s")
+    return session
+
+# Palette quantization: fit on a 15-bit color histogram, map through an 18-bit lookup table
+HIST_BITS = 5
+LUT_BITS = 6
+FIT_SAMPLE = 1 << 19  # pixels histogrammed for the fit; larger images are strided
+
+class PaletteQuantizer:
+    """
+    Reduce an image to at most n_colors, fed in row strips.
+    
+    add() histograms every step-th pixel (by position in the whole image,
+    so the result does not depend on strip size) and keeps only opaque
+    ones, so transparent background never pulls the palette. fit() runs
+    KMeans on the occupied 5-bit-per-channel bins - each bin's mean color,
+    weighted by its pixel count - so the fit costs the same for any image
+    size. map() then replaces every pixel with its nearest center through
+    a 6-bit-per-channel lookup table.
+    """
+    
+    def __init__(self, n_colors: int, total_pixels: int, random_state: int = 42):
+        self.n_colors = n_colors
+        self.random_state = random_state
+        self.step = max(1, total_pixels // FIT_SAMPLE)
+        size = 1 << (3 * HIST_BITS)
+        self.counts = np.zeros(size, np.int64)
+        self.sums = np.zeros((3, size), np.float64)
+        self.palette = None
+        self.lut = None
+    
+    def add(self, rgb_strip: np.ndarray, opaque_strip: Optional[np.ndarray], start_index: int):
+        """Histogram a strip whose first pixel is pixel number start_index of the image."""
+        offset = (-start_index) % self.step
+        sample = rgb_strip.reshape(-1, 3)[offset::self.step]
+        if opaque_strip is not None:
+            sample = sample[opaque_strip.reshape(-1)[offset::self.step]]
+        if len(sample) == 0:
+            return
+        shift = 8 - HIST_BITS
+        bins = (sample[:, 0] >> shift).astype(np.uint32)
+        bins <<= HIST_BITS
+        bins |= sample[:, 1] >> shift
+        bins <<= HIST_BITS
+        bins |= sample[:, 2] >> shift
+        size = len(self.counts)
+        self.counts += np.bincount(bins, minlength=size)
+        for c in range(3):
+            self.sums[c] += np.bincount(bins, weights=sample[:, c], minlength=size)
+    
+    def fit(self) -> bool:
+        """Fit the palette; False if no opaque pixel was seen."""
+        occupied = np.nonzero(self.counts)[0]
+        if len(occupied) == 0:
+            return False
+        weights = self.counts[occupied]
+        # Mean color of each occupied bin, so the fit sees real colors rather than bin corners
+        means = (self.sums[:, occupied] / weights).T
+        
+        n_clusters = max(1, min(self.n_colors, len(occupied)))
+        kmeans = KMeans(n_clusters=n_clusters, random_state=self.random_state, n_init=4)
+        kmeans.fit(means, sample_weight=weights)
+        centers = kmeans.cluster_centers_.astype(np.float32)
+        
+        # Nearest center for the middle of every 6-bit cell
+        lut_shift = 8 - LUT_BITS
+        levels = (np.arange(1 << LUT_BITS, dtype=np.float32) * (1 << lut_shift)) + ((1 << lut_shift) - 1) / 2
+        grid = np.stack(np.meshgrid(levels, levels, levels, indexing='ij'), axis=-1).reshape(-1, 3)
+        distances = ((grid[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        self.lut = distances.argmin(axis=1).astype(np.uint8)
+        self.palette = np.clip(np.rint(centers), 0, 255).astype(np.uint8)
+        return True
+    
+    def map(self, rgb_strip: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Nearest palette color for every pixel of an HxWx3 uint8 strip (written to out if given)."""
+        pixels = rgb_strip.reshape(-1, 3)
+        lut_shift = 8 - LUT_BITS
+        index = (pixels[:, 0] >> lut_shift).astype(np.uint32)
+        index <<= LUT_BITS
+        index |= pixels[:, 1] >> lut_shift
+        index <<= LUT_BITS
+        index |= pixels[:, 2] >> lut_shift
+        quantized = self.palette[self.lut[index]].reshape(rgb_strip.shape)
+        if out is None:
+            return quantized
+        out[...] = quantized
+        return out
+
+def quantize_palette(rgb_array: np.ndarray, opaque: Optional[np.ndarray], n_colors: int,
+                     random_state: int = 42) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reduce an HxWx3 uint8 image to at most n_colors in one go (see PaletteQuantizer).
+    Returns (quantized HxWx3 uint8, palette Nx3 uint8).
+    """
+    quantizer = PaletteQuantizer(n_colors, rgb_array.shape[0] * rgb_array.shape[1], random_state)
+    quantizer.add(rgb_array, opaque, 0)
+    if not quantizer.fit():
+        return rgb_array, np.zeros((0, 3), np.uint8)
+    return quantizer.map(rgb_array), quantizer.palette
+
+def row_tiles(height: int, width: int, bytes_per_px: int, budget_bytes: int, halo: int = 0):
+    """
+    Split height rows into strips whose working set (bytes_per_px per pixel,
+    halo rows included) fits budget_bytes. Yields (y0, y1) row ranges.
+    """
+    rows = budget_bytes // max(1, width * bytes_per_px) - 2 * halo
+    rows = max(1, min(height, rows))
+    for y0 in range(0, height, rows):
+        yield y0, min(height, y0 + rows)
+
+def count_unique_colors(rgb_array: np.ndarray) -> int:
+    """Distinct RGB colors in an HxWx3 uint8 array, counted on packed uint32 values."""
+    pixels = rgb_array.reshape(-1, 3)
+    packed = pixels[:, 0].astype(np.uint32)
+    packed <<= 8
+    packed |= pixels[:, 1]
+    packed <<= 8
+    packed |= pixels[:, 2]
+    if len(packed) < (1 << 16):
+        # Small images: sorting beats touching a 16 MB table
+        return len(np.unique(packed))
+    seen = np.zeros(1 << 24, dtype=bool)
+    seen[packed] = True
+    return int(np.count_nonzero(seen))
+
+class StageCache:
+    """
+    Persistent cache of analysis results and stage outputs, keyed by a hash
+    of the input pixels plus the parameters each stage depends on.
+    
+    Images are stored as PNG (lossless, so a hit is pixel-identical) and
+    analyses as JSON under root/objects, indexed in root/index.sqlite. Once
+    the stored bytes pass max_bytes, least-recently-used entries are evicted.
+    """
+    
+    def __init__(self, root, max_bytes=512 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._conn_pid = None
+        self._lock = threading.Lock()
+    
+    KEY_VERSION = 2  # bump whenever image_key changes what it hashes
+
+    @staticmethod
+    def image_key(img: Image.Image) -> str:
+        """Hash of decoded pixels, so re-encoded copies of a logo share entries."""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"v{StageCache.KEY_VERSION}:{img.mode}:{img.size}".encode())
+        # P/PA pixels are palette indices: recolored palettes must not share entries
+        if img.palette is not None:
+            digest.update(f"palette:{img.palette.mode}:".encode())
+            digest.update(bytes(img.getpalette(None) or ()))
+        digest.update(f"transparency:{img.info.get('transparency')!r}".encode())
+        digest.update(img.tobytes())
+        return digest.hexdigest()
+    
+    @staticmethod
+    def stage_key(stage: str, input_key: str, params) -> str:
+        """Key for a stage output: its input key plus the parameters it depends on."""
+        payload = json.dumps([stage, input_key, params], sort_keys=True, default=str)
+        return hashlib.blake2b(payload.encode(), digest_size=20).hexdigest()
+    
+    def _db(self):
+        # Reopen after fork: SQLite connections must not cross processes
+        if self._conn is None or self._conn_pid != os.getpid():
+            os.makedirs(os.path.join(self.root, "objects"), exist_ok=True)
+            conn = sqlite3.connect(os.path.join(self.root, "index.sqlite"), timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, size INTEGER, last_access REAL)")
+            self._conn, self._conn_pid = conn, os.getpid()
+        return self._conn
+    
+    def _object_path(self, key, ext):
+        return os.path.join(self.root, "objects", key[:2], f"{key}.{ext}")
+    
+    def _touch(self, key):
+        try:
+            with self._lock:
+                conn = self._db()
+                conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+                conn.commit()
+        except sqlite3.Error:
+            pass
+    
+    def _write(self, key, ext, data: bytes):
+        path = self._object_path(key, ext)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            with self._lock:
+                conn = self._db()
+                conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (f"{key}.{ext}", len(data), time.time()))
+                conn.commit()
+                self._evict(conn)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"⚠️ Stage cache write failed: {e}")
+    
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for name, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            conn.execute("DELETE FROM entries WHERE key = ?", (name,))
+            try:
+                os.remove(os.path.join(self.root, "objects", name[:2], name))
+            except OSError:
+                pass
+            total -= size
+            if total <= self.max_bytes:
+                break
+        conn.commit()
+    
+    def get_image(self, key) -> Optional[Image.Image]:
+        try:
+            img = Image.open(self._object_path(key, "png"))
+            img.load()
+        except (OSError, ValueError):
+            return None
+        self._touch(f"{key}.png")
+        return img
+    
+    def put_image(self, key, img: Image.Image):
+        buffer = io.BytesIO()
+        # Fast deflate - entries are re-read far more often than written
+        img.save(buffer, 'PNG', compress_level=1)
+        self._write(key, "png", buffer.getvalue())
+    
+    def get_json(self, key):
+        try:
+            with open(self._object_path(key, "json")) as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._touch(f"{key}.json")
+        return value
+    
+    def put_json(self, key, value):
+        # numpy scalars (np.bool_, np.float64) come out of the analysis maths
+        data = json.dumps(value, default=lambda o: o.item() if hasattr(o, "item") else str(o))
+        self._write(key, "json", data.encode())
+
 class EnhancedLogoPipeline:
     """Enhanced logo processing pipeline with full production capabilities"""
     
-    def __init__(self, output_dir="enhanced_output", temp_dir="temp_processing"):
+    def __init__(self, output_dir="enhanced_output", temp_dir="temp_processing", in_memory=True,
+                 bg_model="u2net", stage_cache=True, stage_cache_bytes=512 * 1024 * 1024,
+                 stage_cache_intermediate=False, analysis_proxy_px=None, memory_budget_mb=256, png_compression="default", layered_output=False):
+        """
+        in_memory: chain stages on decoded images and encode only the final
+        PNG; False writes every intermediate stage to temp_dir (useful for
+        inspecting a single stage).
+        bg_model: rembg model name; its session is loaded once per process.
+        stage_cache: reuse analyses and final outputs (color-normalized art and
+        underbase) for previously seen logo pixels from a StageCache in
+        output_dir/stage_cache (stages are only cached in in_memory mode).
+        stage_cache_intermediate: also cache background removal and upscaling
+        outputs, so runs that change later-stage options resume mid-chain; off
+        by default since each miss then PNG-encodes every stage on the hot path.
+        analysis_proxy_px: run analyze_logo's color/edge statistics on a copy
+        downscaled to this longest side (None = exact, full resolution).
+        memory_budget_mb: per-pixel stages (background fallback, color
+        normalization, underbase) run in row strips so their temporaries
+        stay under this budget; only the stage output is full-frame.
+        png_compression: zlib level for output PNGs, 0-9 or a PNG_COMPRESS_LEVELS
+        name ("proof" is fast, "archive" is smallest).
+        layered_output: also write final art and underbase as pages of one TIFF.
+        """
         self.output_dir = output_dir
         self.temp_dir = temp_dir
+        self.in_memory = in_memory
+        self.bg_model = bg_model
+        self.analysis_proxy_px = analysis_proxy_px
+        self.tile_budget = int(memory_budget_mb * 1024 * 1024)
+        self.png_compress_level = PNG_COMPRESS_LEVELS.get(png_compression, png_compression)
+        if self.png_compress_level not in range(10):
+            raise ValueError(f"Unknown PNG compression: {png_compression}")
+        self.layered_output = layered_output
+        self.last_batch_summary = None
+        self.stage_cache = (StageCache(os.path.join(output_dir, "stage_cache"), stage_cache_bytes)
+                            if stage_cache else None)
+        self.stage_cache_intermediate = stage_cache_intermediate
         os.makedirs(output_dir, exist_ok=True)
         os.makedirs(temp_dir, exist_ok=True)
         
@@ -131,49 +445,55 @@ class EnhancedLogoPipeline:
         self._bg_removal_model = None
         self._upscaler_model = None
         
-    def analyze_logo(self, image_path: str, target_size_in: Dict[str, float]) -> LogoAnalysis:
+    def analyze_logo(self, image_path: str, target_size_in: Dict[str, float], img: Optional[Image.Image] = None,
+                     proxy_max_px: Optional[int] = None) -> LogoAnalysis:
         """
-        Comprehensive logo analysis following the blueprint
+        Comprehensive logo analysis following the blueprint.
+        img: the already-decoded image, to skip decoding image_path again.
+        proxy_max_px: compute color/edge statistics on a copy downscaled to this
+        longest side (approximate, much faster on large inputs); None is exact.
         """
         try:            
-            # Load image
-            img = Image.open(image_path)
-            img_array = np.array(img)
+            # Load image once; everything below works on views of this array
+            if img is None:
+                img = Image.open(image_path)
             
             # Basic properties
             width, height = img.size
             has_alpha = img.mode in ('RGBA', 'LA') or 'transparency' in img.info
             
             # Calculate effective PPI at target size
-            target_w = target_size_in.get('w', 10)
-            target_h = target_size_in.get('h', 10)
-            effective_ppi = min(width / target_w, height / target_h)
+            effective_ppi = effective_ppi_at(width, height, target_size_in)
             
             # Transparency analysis
             alpha_percentage = 0.0
-            if has_alpha and img.mode == 'RGBA':
-                alpha_channel = np.array(img)[:,:,3]
-                alpha_percentage = (alpha_channel < 255).sum() / alpha_channel.size * 100
-            
-            # Color analysis
             if img.mode == 'RGBA':
-                rgb_img = img.convert('RGB')
+                img_array = np.asarray(img)
+                rgb_array = img_array[:, :, :3]
+                if has_alpha:
+                    alpha_percentage = np.count_nonzero(img_array[:, :, 3] < 255) / (width * height) * 100
             else:
-                rgb_img = img
-                
+                rgb_array = np.asarray(img if img.mode == 'RGB' else img.convert('RGB'))
+            
+            # Optional proxy for the statistics below
+            scale = 1.0
+            if proxy_max_px and max(width, height) > proxy_max_px:
+                scale = proxy_max_px / max(width, height)
+                rgb_array = cv2.resize(rgb_array, (max(1, round(width * scale)), max(1, round(height * scale))),
+                                       interpolation=cv2.INTER_AREA)
+            
             # Unique colors (after small blur to merge similar)
-            rgb_array = np.array(rgb_img)
             blurred = cv2.GaussianBlur(rgb_array, (3, 3), 0)
-            unique_colors = len(np.unique(blurred.reshape(-1, blurred.shape[2]), axis=0))
+            unique_colors = count_unique_colors(blurred)
             
             # Color entropy
-            stat = ImageStat.Stat(rgb_img)
-            color_entropy = sum(stat.var) / len(stat.var)  # Simplified entropy measure
+            _, stddev = cv2.meanStdDev(rgb_array)
+            color_entropy = float((stddev ** 2).mean())  # Simplified entropy measure
             
             # Flat logo detection heuristic
             gray = cv2.cvtColor(rgb_array, cv2.COLOR_RGB2GRAY)
             edges = cv2.Canny(gray, 50, 150)
-            edge_density = np.sum(edges > 0) / edges.size
+            edge_density = np.count_nonzero(edges) / edges.size
             
             local_var = cv2.Laplacian(gray, cv2.CV_64F).var()
             is_flat_logo = (unique_colors <= 12 and edge_density > 0.01 and local_var < 500)
@@ -181,9 +501,8 @@ class EnhancedLogoPipeline:
             # JPEG artifact detection
             has_jpeg_artifacts = False
             if image_path.lower().endswith('.jpg') or image_path.lower().endswith('.jpeg'):
-                # Simple blockiness detection
-                dct_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-                has_jpeg_artifacts = dct_var < 100  # Low variance suggests compression
+                # Simple blockiness detection (same Laplacian variance as above)
+                has_jpeg_artifacts = local_var < 100  # Low variance suggests compression
             
             # Stroke width estimation (simplified)
             min_stroke_width_pt = 1.0  # Default
@@ -191,7 +510,7 @@ class EnhancedLogoPipeline:
                 # Estimate minimum stroke width using distance transform
                 _, binary = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY)
                 dist_transform = cv2.distanceTransform(binary, cv2.DIST_L2, 5)
-                min_stroke_width_pt = max(0.5, np.min(dist_transform[dist_transform > 0]) * 72 / effective_ppi)
+                min_stroke_width_pt = max(0.5, np.min(dist_transform[dist_transform > 0]) / scale * 72 / effective_ppi)
             
             # Text detection (simplified)
             text_confidence = 0.0
@@ -258,67 +577,95 @@ class EnhancedLogoPipeline:
         """
         Advanced background removal using AI models
         """
+        try:
+            img = Image.open(image_path)
+            result_img = self.remove_background_image(img)
+            if result_img is img:
+                return image_path
+            return self._save_stage(result_img, "bg_removed_", image_path)
+        except Exception as e:
+            logger.error(f"Background removal failed: {str(e)}")
+            return image_path
+    
+    def remove_background_image(self, img: Image.Image) -> Image.Image:
+        """In-memory background removal: returns an RGBA image, or img unchanged on failure"""
         try:
             # Try to use rembg for AI background removal
             if REMBG_AVAILABLE:
-                with open(image_path, 'rb') as f:
-                    input_data = f.read()
-                
-                output_data = rembg_remove(input_data)
-                
-                # Save result
-                output_path = os.path.join(self.temp_dir, f"bg_removed_{os.path.basename(image_path)}")
-                with open(output_path, 'wb') as f:
-                    f.write(output_data)
-                
-                return output_path
-        else:
+                session = self._get_bg_session()
+                start_time = time.time()
+                result_img = rembg_remove(img, session=session)
+                BG_REMOVAL_STATS["calls"] += 1
+                BG_REMOVAL_STATS["total_s"] += time.time() - start_time
+                return result_img
+            else:
                 # Fallback to simple background removal
-                return self._simple_background_removal(image_path)
+                return self._simple_background_removal_image(img)
                 
         except Exception as e:
             logger.error(f"Background removal failed: {str(e)}")
-            return image_path
+            return img
+    
+    def remove_background_batch(self, images: List[Image.Image]) -> List[Image.Image]:
+        """
+        Background removal for many decoded images through one model session.
+        rembg has no batched predict, so images run back to back on the shared
+        session; failed images come back unchanged.
+        """
+        if REMBG_AVAILABLE:
+            self._get_bg_session()
+        return [self.remove_background_image(img) for img in images]
+    
+    def _get_bg_session(self):
+        if self._bg_removal_model is None:
+            self._bg_removal_model = get_rembg_session(self.bg_model)
+        return self._bg_removal_model
     
     def _simple_background_removal(self, image_path: str) -> str:
         """Fallback background removal using traditional methods"""
         try:
             img = Image.open(image_path)
-            
+            result_img = self._simple_background_removal_image(img)
+            if result_img is img:
+                return image_path
+            return self._save_stage(result_img, "bg_removed_", image_path)
+        except Exception as e:
+            logger.error(f"Simple background removal failed: {str(e)}")
+            return image_path
+    
+    def _simple_background_removal_image(self, img: Image.Image) -> Image.Image:
+        """Corner-colour background removal on a decoded image"""
+        try:
             # If already has transparency, just return
             if img.mode == 'RGBA':
-                return image_path
+                return img
             
-            # Convert to OpenCV format
-            img_array = np.array(img.convert('RGB'))
-            img_cv = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
+            rgb_img = img if img.mode == 'RGB' else img.convert('RGB')
+            width, height = rgb_img.size
             
             # Simple background removal using color similarity
             # Sample corners to determine background color
-            h, w = img_cv.shape[:2]
             corners = [
-                img_cv[0, 0], img_cv[0, w-1], 
-                img_cv[h-1, 0], img_cv[h-1, w-1]
+                rgb_img.getpixel((0, 0)), rgb_img.getpixel((width-1, 0)),
+                rgb_img.getpixel((0, height-1)), rgb_img.getpixel((width-1, height-1))
             ]
-            bg_color = np.mean(corners, axis=0)
-            
-            # Create mask based on color similarity
-            diff = np.sqrt(np.sum((img_cv - bg_color) ** 2, axis=2))
-            mask = diff > 30  # Threshold for background detection
+            bg_color = np.mean(corners, axis=0).astype(np.float32)
             
-            # Create RGBA image
-            rgba_img = np.dstack([img_array, mask.astype(np.uint8) * 255])
-            result_img = Image.fromarray(rgba_img, 'RGBA')
+            # Mask pixels further than 30 from the background color, strip by strip in float32
+            rgba_array = np.empty((height, width, 4), np.uint8)
+            for y0, y1 in row_tiles(height, width, 24, self.tile_budget):
+                strip = np.asarray(rgb_img.crop((0, y0, width, y1)))
+                diff = strip.astype(np.float32)
+                diff -= bg_color
+                diff *= diff
+                rgba_array[y0:y1, :, :3] = strip
+                rgba_array[y0:y1, :, 3] = (diff.sum(axis=2) > 30 ** 2) * np.uint8(255)
             
-            # Save result
-            output_path = os.path.join(self.temp_dir, f"bg_removed_{os.path.basename(image_path)}")
-            result_img.save(output_path, 'PNG')
-            
-            return output_path
+            return Image.fromarray(rgba_array, 'RGBA')
             
         except Exception as e:
             logger.error(f"Simple background removal failed: {str(e)}")
-            return image_path
+            return img
     
     def upscale_logo(self, image_path: str, analysis: LogoAnalysis, target_ppi: int = 300) -> str:
         """
@@ -326,11 +673,22 @@ class EnhancedLogoPipeline:
         """
         try:
             img = Image.open(image_path)
+            upscaled = self.upscale_image(img, analysis, target_ppi)
+            if upscaled is img:
+                return image_path
+            return self._save_stage(upscaled, "upscaled_", image_path, optimize=True)
+        except Exception as e:
+            logger.error(f"Upscaling failed: {str(e)}")
+            return image_path
+    
+    def upscale_image(self, img: Image.Image, analysis: LogoAnalysis, target_ppi: int = 300) -> Image.Image:
+        """In-memory upscaling: returns img unchanged if no upscale is needed or it fails"""
+        try:
             current_ppi = analysis.effective_ppi
             
             # Skip if already high enough resolution
             if current_ppi >= target_ppi:
-                return image_path
+                return img
             
             scale_factor = target_ppi / current_ppi
             new_size = (int(img.width * scale_factor), int(img.height * scale_factor))
@@ -349,15 +707,11 @@ class EnhancedLogoPipeline:
             if scale_factor > 1.5:
                 upscaled = upscaled.filter(ImageFilter.UnsharpMask(radius=1, percent=60, threshold=3))
             
-            # Save result
-            output_path = os.path.join(self.temp_dir, f"upscaled_{os.path.basename(image_path)}")
-            upscaled.save(output_path, 'PNG', optimize=True)
-            
-            return output_path
+            return upscaled
         
         except Exception as e:
             logger.error(f"Upscaling failed: {str(e)}")
-            return image_path
+            return img
     
     def normalize_colors(self, image_path: str, job: JobManifest, analysis: LogoAnalysis) -> str:
         """
@@ -365,57 +719,63 @@ class EnhancedLogoPipeline:
         """
         try:
             img = Image.open(image_path)
+            result_img = self.normalize_colors_image(img, job, analysis)
+            if result_img is img:
+                return image_path
+            return self._save_stage(result_img, "color_norm_", image_path)
+        except Exception as e:
+            logger.error(f"Color normalization failed: {str(e)}")
+            return image_path
+    
+    def normalize_colors_image(self, img: Image.Image, job: JobManifest, analysis: LogoAnalysis) -> Image.Image:
+        """
+        In-memory color normalization: returns img unchanged on failure.
+        Runs in row strips so temporaries stay within the tile budget.
+        """
+        try:
+            width, height = img.size
+            has_alpha = img.mode == 'RGBA'
+            result_array = np.empty((height, width, 4 if has_alpha else 3), np.uint8)
+            rgb_out = result_array[:, :, :3]
+            tiles = list(row_tiles(height, width, 24, self.tile_budget))
             
-            # Convert to RGB if needed
-            if img.mode == 'RGBA':
-                rgb_img = Image.new('RGB', img.size, (255, 255, 255))
-                rgb_img.paste(img, mask=img.split()[-1])
-                alpha = img.split()[-1]
-            else:
-                rgb_img = img.convert('RGB')
-                alpha = None
-            
-            img_array = np.array(rgb_img)
+            # Pass 1: flatten onto white (RGBA) or convert to RGB, strip by strip
+            for y0, y1 in tiles:
+                strip = img.crop((0, y0, width, y1))
+                if has_alpha:
+                    rgb_strip = Image.new('RGB', strip.size, (255, 255, 255))
+                    rgb_strip.paste(strip, mask=strip.split()[-1])
+                    result_array[y0:y1, :, 3] = np.asarray(strip.getchannel('A'))
+                else:
+                    rgb_strip = strip.convert('RGB')
+                rgb_out[y0:y1] = np.asarray(rgb_strip)
             
             # Color reduction based on print method
             if job.method == PrintMethod.SCREEN_PRINT and KMeans is not None:
                 # Aggressive color reduction for screen printing
                 max_colors = job.options.get('max_colors_screen', 6)
+                quantizer = PaletteQuantizer(min(max_colors, analysis.unique_colors), width * height)
                 
-                # Reshape for clustering
-                pixels = img_array.reshape(-1, 3)
-                
-                # K-means clustering to reduce colors
-                kmeans = KMeans(n_clusters=min(max_colors, analysis.unique_colors), random_state=42)
-                kmeans.fit(pixels)
-                
-                # Replace colors with cluster centers
-                new_colors = kmeans.cluster_centers_.astype(np.uint8)
-                labels = kmeans.labels_
-                quantized = new_colors[labels].reshape(img_array.shape)
+                # Fit the palette on visible pixels only
+                for y0, y1 in tiles:
+                    opaque = result_array[y0:y1, :, 3] >= 128 if has_alpha else None
+                    quantizer.add(rgb_out[y0:y1], opaque, y0 * width)
+                if quantizer.fit():
+                    for y0, y1 in tiles:
+                        quantizer.map(rgb_out[y0:y1], out=rgb_out[y0:y1])
                 
-                result_img = Image.fromarray(quantized, 'RGB')
-                
-                else:
+            else:
                 # For DTF/DTG, preserve more colors but merge similar ones
                 # Simple color merging by rounding
-                rounded = (img_array // 8) * 8  # Reduce to fewer color levels
-                result_img = Image.fromarray(rounded, 'RGB')
-            
-            # Restore alpha if present
-            if alpha:
-                result_img = result_img.convert('RGBA')
-                result_img.putalpha(alpha)
+                for y0, y1 in tiles:
+                    rgb_out[y0:y1] &= 0xF8  # Same as (x // 8) * 8 - fewer color levels
             
-            # Save result
-            output_path = os.path.join(self.temp_dir, f"color_norm_{os.path.basename(image_path)}")
-            result_img.save(output_path, 'PNG')
-            
-            return output_path
+            # Alpha was carried through in the fourth channel
+            return Image.fromarray(result_array, 'RGBA' if has_alpha else 'RGB')
                 
-            except Exception as e:
+        except Exception as e:
             logger.error(f"Color normalization failed: {str(e)}")
-            return image_path
+            return img
     
     def generate_underbase(self, image_path: str, job: JobManifest) -> Optional[str]:
         """
@@ -425,40 +785,56 @@ class EnhancedLogoPipeline:
             return None
             
         try:
-            img = Image.open(image_path)
-            
-            # Convert to grayscale for underbase
-            if img.mode == 'RGBA':
-                # Use alpha as mask
-                alpha = img.split()[-1]
-                rgb = img.convert('RGB')
-                gray = rgb.convert('L')
-                
-                # Create underbase based on luminance
-                underbase = ImageChops.lighter(gray, alpha)
-                
-            else:
-                gray = img.convert('L')
-                # Create simple underbase
-                underbase = gray
+            underbase = self.generate_underbase_image(Image.open(image_path), job)
+            if underbase is None:
+                return None
+            return self._save_stage(underbase, "underbase_", image_path)
+        except Exception as e:
+            logger.error(f"Underbase generation failed: {str(e)}")
+            return None
+    
+    def generate_underbase_image(self, img: Image.Image, job: JobManifest) -> Optional[Image.Image]:
+        """In-memory underbase: an 'L' image, or None if not needed or on failure"""
+        if job.method not in [PrintMethod.DTF, PrintMethod.DTG]:
+            return None
             
-            # Apply choke (erosion) to prevent bleeding
-            choke_px = max(1, int(job.options.get('underbase_choke_pt', 0.75) * 4))  # Convert pt to px
+        try:
+            width, height = img.size
             
-            # Simple choke using minimum filter
-            for _ in range(choke_px):
-                underbase = underbase.filter(ImageFilter.MinFilter(3))
+            # Apply choke (erosion) to prevent bleeding, in points at the image's print DPI
+            dpi = effective_ppi_at(width, height, job.target_size_in)
+            choke_px = underbase_choke_px(job.options.get('underbase_choke_pt', 0.75), dpi)
+            shape = job.options.get('underbase_choke_shape', 'disk')
+            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE if shape == 'disk' else cv2.MORPH_RECT,
+                                               (2 * choke_px + 1, 2 * choke_px + 1))
             
-            # Save underbase
-            output_path = os.path.join(self.temp_dir, f"underbase_{os.path.basename(image_path)}")
-            underbase.save(output_path, 'PNG')
+            # Strips carry choke_px extra rows on each side so the erosion sees its whole neighbourhood
+            underbase = np.empty((height, width), np.uint8)
+            for y0, y1 in row_tiles(height, width, 8, self.tile_budget, halo=choke_px):
+                top, bottom = max(0, y0 - choke_px), min(height, y1 + choke_px)
+                strip = img.crop((0, top, width, bottom))
+                
+                # Convert to grayscale for underbase
+                gray = np.asarray(strip.convert('L'))
+                if img.mode == 'RGBA':
+                    # Create underbase based on luminance, with alpha as mask
+                    gray = np.maximum(gray, np.asarray(strip.getchannel('A')))
+                
+                # One erosion with a kernel of the choke radius
+                underbase[y0:y1] = cv2.erode(gray, kernel)[y0 - top:y1 - top]
             
-            return output_path
+            return Image.fromarray(underbase, 'L')
             
-                except Exception as e:
+        except Exception as e:
             logger.error(f"Underbase generation failed: {str(e)}")
             return None
     
+    def _save_stage(self, img: Image.Image, prefix: str, source_path: str, **save_options) -> str:
+        """Write an intermediate stage result to temp_dir as PNG"""
+        output_path = os.path.join(self.temp_dir, f"{prefix}{os.path.basename(source_path)}")
+        img.save(output_path, 'PNG', **save_options)
+        return output_path
+    
     def validate_for_production(self, image_path: str, analysis: LogoAnalysis, job: JobManifest) -> Dict[str, Any]:
         """
         Quality control gates for production readiness
@@ -467,7 +843,7 @@ class EnhancedLogoPipeline:
         warnings = []
         
         # PPI check - realistic for web logo scenarios  
-        if analysis.effective_ppi < 50:  # Only block truly unusable resolution (under 0.5 inch at 100 PPI)
+        if analysis.effective_ppi < MIN_PRODUCTION_PPI:  # Only block truly unusable resolution (under 0.5 inch at 100 PPI)
             issues.append("Resolution too low for production")
         elif analysis.effective_ppi < 100:
             warnings.append("Low resolution - consider higher quality source or smaller print size")
@@ -489,15 +865,145 @@ class EnhancedLogoPipeline:
             file_size_mb = os.path.getsize(image_path) / (1024 * 1024)
             if file_size_mb > 50:
                 warnings.append("Large file size may cause processing delays")
-                                except:
-                                    pass
+        except:
+            pass
+        
+        return quality_report(issues, warnings)
+    
+    def rasterize_svg(self, image_path: str, job: JobManifest) -> str:
+        """
+        Render an SVG logo to a PNG in temp_dir, job.dpi_min pixels per inch
+        across the target width. Pillow cannot open SVG, so this runs before
+        pre-flight; without cairosvg the logo is rejected with a clear error.
+        """
+        if not CAIROSVG_AVAILABLE:
+            raise ValueError("SVG logo cannot be processed without cairosvg. Install with: pip install cairosvg")
+        output_path = os.path.join(self.temp_dir, os.path.splitext(os.path.basename(image_path))[0] + "_svg.png")
+        output_width = int(round(job.target_size_in.get('w', 10) * job.dpi_min))
+        cairosvg.svg2png(url=image_path, write_to=output_path, output_width=output_width)
+        return output_path
+    
+    def preflight(self, image_path: str, job: JobManifest) -> Dict[str, Any]:
+        """
+        Header-only check run before any pixel is decoded: size, mode and
+        alpha presence, and the effective PPI at the job's target size.
+        `issues` lists reasons the logo can never pass validation.
+        """
+        start_time = time.time()
+        with Image.open(image_path) as img:  # lazy - reads the header only
+            width, height = img.size
+            mode = img.mode
+            has_alpha = img.mode in ('RGBA', 'LA') or 'transparency' in img.info
+        
+        effective_ppi = effective_ppi_at(width, height, job.target_size_in)
+        issues = []
+        if effective_ppi < MIN_PRODUCTION_PPI:
+            issues.append("Resolution too low for production")
         
         return {
-            "passed": len(issues) == 0,
+            "width": width,
+            "height": height,
+            "mode": mode,
+            "has_alpha": has_alpha,
+            "effective_ppi": effective_ppi,
             "issues": issues,
-            "warnings": warnings,
-            "quality_score": max(0, 100 - len(issues) * 25 - len(warnings) * 5)
+            "time": time.time() - start_time
+        }
+    
+    def warm_up(self):
+        """
+        Load heavy resources (OpenCV, the background removal model) before
+        the first real job by running the stages once on a tiny image.
+        """
+        sample = Image.new('RGB', (8, 8), (255, 255, 255))
+        self.remove_background_image(sample)
+        cv2.Canny(np.zeros((8, 8), np.uint8), 50, 150)
+        # The first inference pays for ONNX runtime setup - count it as cold start
+        BG_REMOVAL_STATS["cold_start_s"] += BG_REMOVAL_STATS["total_s"]
+        BG_REMOVAL_STATS["calls"] = 0
+        BG_REMOVAL_STATS["total_s"] = 0.0
+    
+    def iter_process_batch(self, items, workers: Optional[int] = None):
+        """
+        Process many (image_path, JobManifest) pairs on a process pool.
+        Each worker builds its own pipeline and warms it up once; results
+        are yielded in completion order with `worker_pid` and `queue_time`
+        (seconds from submission to the worker picking the job up) added.
+        workers defaults to the number of usable cores.
+        """
+        items = list(items)
+        if not items:
+            return
+        workers = max(1, min(int(workers or available_cores()), len(items)))
+        logger.info(f"🚀 Processing {len(items)} logos on {workers} worker processes")
+        
+        submitted_at = time.time()
+        with multiprocessing.Pool(workers, initializer=_init_batch_worker,
+                                  initargs=(self.output_dir, self.temp_dir, self._worker_options())) as pool:
+            for result in pool.imap_unordered(_process_batch_item, [(path, job, submitted_at) for path, job in items]):
+                yield result
+    
+    def _worker_options(self) -> Dict[str, Any]:
+        """Constructor options a batch worker needs to rebuild this pipeline."""
+        return {
+            "in_memory": self.in_memory,
+            "bg_model": self.bg_model,
+            "stage_cache": self.stage_cache is not None,
+            "stage_cache_bytes": self.stage_cache.max_bytes if self.stage_cache else 0,
+            "stage_cache_intermediate": self.stage_cache_intermediate,
+            "analysis_proxy_px": self.analysis_proxy_px,
+            "memory_budget_mb": self.tile_budget / (1024 * 1024),
+            "png_compression": self.png_compress_level,
+            "layered_output": self.layered_output,
+        }
+    
+    def process_batch(self, items, workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Run iter_process_batch to completion and log a summary."""
+        start_time = time.time()
+        results = []
+        items = list(items)
+        for result in self.iter_process_batch(items, workers):
+            results.append(result)
+            if len(results) % 50 == 0:
+                logger.info(f"📊 Progress: {len(results)}/{len(items)} logos")
+        
+        elapsed = time.time() - start_time
+        succeeded = sum(1 for r in results if r.get("success"))
+        cpu_time = sum(r.get("processing_time", 0) for r in results)
+        logger.info(f"🏁 Batch done: {succeeded}/{len(results)} passed in {elapsed:.1f}s - "
+                    f"{len(results) / max(elapsed, 1e-6):.1f} logos/s - {cpu_time:.1f}s total processing time")
+        
+        # Time saved by pre-flight: rejected logos would have cost an average processed logo each
+        rejected = [r for r in results if (r.get("preflight") or {}).get("issues")]
+        processed = [r for r in results if r.get("analysis") is not None]
+        avg_processed = sum(r["processing_time"] for r in processed) / max(1, len(processed))
+        time_saved = max(0.0, len(rejected) * avg_processed - sum(r["processing_time"] for r in rejected))
+        if rejected:
+            logger.info(f"⏭️ Pre-flight rejected {len(rejected)} logos from headers alone - saved ~{time_saved:.1f}s "
+                        f"of processing ({avg_processed:.2f}s per processed logo)")
+        self.last_batch_summary = {
+            "logos": len(results),
+            "passed": succeeded,
+            "elapsed": elapsed,
+            "processing_time": cpu_time,
+            "preflight_rejected": len(rejected),
+            "preflight_time_saved": time_saved,
         }
+        
+        hits = sum(r.get("cache", {}).get("hits", 0) for r in results)
+        misses = sum(r.get("cache", {}).get("misses", 0) for r in results)
+        if hits or misses:
+            logger.info(f"💾 Stage cache: {hits} hits, {misses} misses")
+        
+        # Stats are cumulative per worker, so the last snapshot from each pid is its total
+        per_worker = {r["worker_pid"]: r["bg_removal_stats"] for r in results if "bg_removal_stats" in r}
+        calls = sum(stats["calls"] for stats in per_worker.values())
+        if calls:
+            cold_start = sum(stats["cold_start_s"] for stats in per_worker.values())
+            steady = sum(stats["total_s"] for stats in per_worker.values()) / calls
+            logger.info(f"🧠 Background removal: {cold_start:.1f}s cold start across {len(per_worker)} workers, "
+                        f"{steady * 1000:.0f}ms/logo steady state")
+        return results
     
     def process_logo_complete(self, image_path: str, job: JobManifest) -> Dict[str, Any]:
         """
@@ -513,72 +1019,58 @@ class EnhancedLogoPipeline:
             "analysis": None,
             "validation": None,
             "processing_time": 0,
-            "success": False
+            "success": False,
+            "cache": {"hits": 0, "misses": 0, "stages": {}}
         }
         
         try:
-            # Step 1: Analyze
-            logger.info("📊 Analyzing logo...")
-            analysis = self.analyze_logo(image_path, job.target_size_in)
-            results["analysis"] = asdict(analysis)
+            # SVG logos (inline or .svg URLs from the scraper) need pixels first
+            if image_path.lower().endswith('.svg'):
+                logger.info("🖋️ Rasterizing SVG logo...")
+                image_path = self.rasterize_svg(image_path, job)
+                results["rasterized_path"] = image_path
             
-            current_file = image_path
+            # Step 0: Header-only pre-flight - skip hopeless inputs before decoding
+            preflight = self.preflight(image_path, job)
+            results["preflight"] = preflight
+            if preflight["issues"]:
+                logger.info(f"⏭️ Pre-flight rejected job {job.job_id}: {preflight['width']}x{preflight['height']} is "
+                            f"{preflight['effective_ppi']:.0f} PPI at target size")
+                results["validation"] = quality_report(preflight["issues"], [])
+                results["processing_time"] = time.time() - start_time
+                return results
             
-            # Step 2: Background removal if needed
-            if not analysis.has_transparency:
-                logger.info("🖼️ Removing background...")
-                current_file = self.remove_background(current_file)
-                results["processed_files"]["background_removed"] = current_file
+            # Decode once for the cache key, the analysis and the in-memory stages
+            source = Image.open(image_path)
+            source.load()
+            source_key = StageCache.image_key(source) if self.stage_cache is not None else None
             
-            # Step 3: Upscaling if needed
-            if analysis.effective_ppi < job.dpi_min:
-                logger.info("🔍 Upscaling logo...")
-                current_file = self.upscale_logo(current_file, analysis, job.dpi_min)
-                results["processed_files"]["upscaled"] = current_file
+            # Step 1: Analyze
+            analysis = self._analyze_cached(image_path, job, source, source_key, results["cache"])
+            results["analysis"] = asdict(analysis)
             
-            # Step 4: Color normalization
-            logger.info("🎨 Normalizing colors...")
-            current_file = self.normalize_colors(current_file, job, analysis)
-            results["processed_files"]["color_normalized"] = current_file
+            if self.in_memory:
+                final, underbase = self._run_stages_in_memory(image_path, job, analysis, source, source_key,
+                                                              results["cache"])
+            else:
+                final, underbase = self._run_stages_on_files(image_path, job, analysis, results)
             
-            # Step 5: Generate underbase if needed
-            if job.method in [PrintMethod.DTF, PrintMethod.DTG]:
-                logger.info("⚪ Generating underbase...")
-                underbase_path = self.generate_underbase(current_file, job)
-                if underbase_path:
-                    results["processed_files"]["underbase"] = underbase_path
+            # Step 6: Write print-ready artifacts in parallel
+            logger.info("💾 Writing output files...")
+            written = write_artifacts(self._output_artifacts(job, final, underbase), self.png_compress_level)
+            if not self.in_memory:
+                self._remove_intermediates(image_path, results["processed_files"])
+            
+            # Keep only the output files in results
+            results["processed_files"] = {name: info["path"] for name, info in written.items()}
+            results["artifacts"] = written
+            final_output_path = results["processed_files"]["final"]
             
-            # Step 6: Final validation
+            # Final validation
             logger.info("✅ Running quality validation...")
-            validation = self.validate_for_production(current_file, analysis, job)
+            validation = self.validate_for_production(final_output_path, analysis, job)
             results["validation"] = validation
             
-            # Final output
-            final_output_path = os.path.join(self.output_dir, f"{job.job_id}_final.png")
-            
-            # Copy final processed file
-            import shutil
-            shutil.copy2(current_file, final_output_path)
-            results["processed_files"]["final"] = final_output_path
-            
-            # Clean up intermediate files to save space
-            intermediate_files = [
-                results["processed_files"].get("background_removed"),
-                results["processed_files"].get("upscaled"), 
-                results["processed_files"].get("color_normalized"),
-                results["processed_files"].get("underbase")
-            ]
-            
-            for temp_file in intermediate_files:
-                if temp_file and temp_file != final_output_path and os.path.exists(temp_file):
-                    try:
-                        os.remove(temp_file)
-                    except:
-                        pass  # Ignore cleanup errors
-            
-            # Keep only final file in results
-            results["processed_files"] = {"final": final_output_path}
-            
             results["success"] = validation["passed"]
             results["processing_time"] = time.time() - start_time
             
@@ -586,15 +1078,259 @@ class EnhancedLogoPipeline:
             
             return results
                             
-                except Exception as e:
+        except Exception as e:
             logger.error(f"❌ Processing failed: {str(e)}")
             results["error"] = str(e)
             results["processing_time"] = time.time() - start_time
             return results
+    
+    def _analyze_cached(self, image_path: str, job: JobManifest, source: Image.Image, source_key: Optional[str],
+                        cache_stats: Dict[str, Any]) -> LogoAnalysis:
+        """analyze_logo through the stage cache when source_key is given"""
+        if source_key is None:
+            logger.info("📊 Analyzing logo...")
+            return self.analyze_logo(image_path, job.target_size_in, source, self.analysis_proxy_px)
+        
+        # JPEG artifact detection looks at the file extension, so it is part of the key
+        is_jpeg = image_path.lower().endswith(('.jpg', '.jpeg'))
+        key = StageCache.stage_key("analysis", source_key, [job.target_size_in, is_jpeg, self.analysis_proxy_px])
+        cached = self.stage_cache.get_json(key)
+        if cached is not None:
+            _count_cache(cache_stats, "analysis", "hit")
+            cached["logo_type"] = LogoType(cached["logo_type"])
+            return LogoAnalysis(**cached)
+        
+        logger.info("📊 Analyzing logo...")
+        analysis = self.analyze_logo(image_path, job.target_size_in, source, self.analysis_proxy_px)
+        # A failed analysis returns defaults - don't cache those
+        if "Analysis failed" not in analysis.quality_issues:
+            self.stage_cache.put_json(key, {**asdict(analysis), "logo_type": analysis.logo_type.value})
+            _count_cache(cache_stats, "analysis", "miss")
+        return analysis
+    
+    def _run_stages_in_memory(self, image_path: str, job: JobManifest, analysis: LogoAnalysis,
+                              source: Optional[Image.Image] = None, source_key: Optional[str] = None,
+                              cache_stats: Optional[Dict[str, Any]] = None):
+        """
+        Run steps 2-5 on one decoded image; nothing is encoded here.
+        With a stage cache and source_key, resume after the last cached stage.
+        Returns (final image, underbase image or None).
+        """
+        img = source
+        if img is None:
+            img = Image.open(image_path)
+            img.load()
+        
+        # (name, log line, stage function, parameters the output depends on)
+        stages = []
+        # Step 2: Background removal if needed
+        if not analysis.has_transparency:
+            stages.append(("background_removed", "🖼️ Removing background...", self.remove_background_image,
+                           [self.bg_model if REMBG_AVAILABLE else "simple"]))
+        # Step 3: Upscaling if needed
+        if analysis.effective_ppi < job.dpi_min:
+            stages.append(("upscaled", "🔍 Upscaling logo...",
+                           lambda im: self.upscale_image(im, analysis, job.dpi_min),
+                           [job.dpi_min, analysis.effective_ppi, analysis.is_flat_logo, analysis.logo_type.value]))
+        # Step 4: Color normalization
+        stages.append(("color_normalized", "🎨 Normalizing colors...",
+                       lambda im: self.normalize_colors_image(im, job, analysis),
+                       [job.method.value, job.options.get('max_colors_screen', 6), analysis.unique_colors,
+                        "histogram-kmeans"]))
+        
+        use_cache = self.stage_cache is not None and source_key is not None
+        cache_stats = cache_stats if cache_stats is not None else {}
+        keys = []
+        key = source_key
+        for name, _, _, params in stages:
+            key = StageCache.stage_key(name, key, params) if use_cache else None
+            keys.append(key)
+        
+        # Only the last stage is cached unless intermediate caching is on
+        cached_from = 0 if self.stage_cache_intermediate else len(stages) - 1
+        
+        # Resume after the last stage whose output is cached
+        start = 0
+        if use_cache:
+            for i in range(len(stages) - 1, cached_from - 1, -1):
+                cached = self.stage_cache.get_image(keys[i])
+                if cached is not None:
+                    img, start = cached, i + 1
+                    _count_cache(cache_stats, stages[i][0], "hit")
+                    for name, _, _, _ in stages[:i]:
+                        cache_stats["stages"][name] = "skipped"
+                    break
+        
+        for i in range(start, len(stages)):
+            name, message, stage, _ = stages[i]
+            logger.info(message)
+            result_img = stage(img)
+            # An unchanged image means the stage failed or had nothing to do - don't pin that in the cache
+            if use_cache and i >= cached_from and result_img is not img:
+                self.stage_cache.put_image(keys[i], result_img)
+                _count_cache(cache_stats, name, "miss")
+            img = result_img
+        
+        # Step 5: Generate underbase if needed
+        if job.method in [PrintMethod.DTF, PrintMethod.DTG]:
+            underbase_params = [job.options.get('underbase_choke_pt', 0.75),
+                                job.options.get('underbase_choke_shape', 'disk'), job.target_size_in, "erode"]
+            underbase_key = StageCache.stage_key("underbase", keys[-1], underbase_params) if use_cache else None
+            underbase = self.stage_cache.get_image(underbase_key) if use_cache else None
+            if underbase is not None:
+                _count_cache(cache_stats, "underbase", "hit")
+            else:
+                logger.info("⚪ Generating underbase...")
+                underbase = self.generate_underbase_image(img, job)
+                if use_cache and underbase is not None:
+                    self.stage_cache.put_image(underbase_key, underbase)
+                    _count_cache(cache_stats, "underbase", "miss")
+        else:
+            underbase = None
+        
+        return img, underbase
+    
+    def _run_stages_on_files(self, image_path: str, job: JobManifest, analysis: LogoAnalysis,
+                             results: Dict[str, Any]):
+        """
+        Run steps 2-5 with a PNG in temp_dir between each stage.
+        Returns (final file, underbase file or None); both still in temp_dir.
+        """
+        current_file = image_path
+        
+        # Step 2: Background removal if needed
+        if not analysis.has_transparency:
+            logger.info("🖼️ Removing background...")
+            current_file = self.remove_background(current_file)
+            results["processed_files"]["background_removed"] = current_file
+        
+        # Step 3: Upscaling if needed
+        if analysis.effective_ppi < job.dpi_min:
+            logger.info("🔍 Upscaling logo...")
+            current_file = self.upscale_logo(current_file, analysis, job.dpi_min)
+            results["processed_files"]["upscaled"] = current_file
+        
+        # Step 4: Color normalization
+        logger.info("🎨 Normalizing colors...")
+        current_file = self.normalize_colors(current_file, job, analysis)
+        results["processed_files"]["color_normalized"] = current_file
+        
+        # Step 5: Generate underbase if needed
+        underbase_path = None
+        if job.method in [PrintMethod.DTF, PrintMethod.DTG]:
+            logger.info("⚪ Generating underbase...")
+            underbase_path = self.generate_underbase(current_file, job)
+            if underbase_path:
+                results["processed_files"]["underbase"] = underbase_path
+        
+        return current_file, underbase_path
+    
+    def _remove_intermediates(self, image_path: str, processed_files: Dict[str, str]):
+        """Clean up temp_dir stage files to save space (never the input itself)"""
+        for name in ("background_removed", "upscaled", "color_normalized", "underbase"):
+            temp_file = processed_files.get(name)
+            if temp_file and temp_file != image_path and os.path.exists(temp_file):
+                try:
+                    os.remove(temp_file)
+                except:
+                    pass  # Ignore cleanup errors
+    
+    def _output_artifacts(self, job: JobManifest, final, underbase) -> Dict[str, Tuple[str, Any]]:
+        """Artifact name -> (output path, image / file to copy / list of layers)"""
+        artifacts = {"final": (os.path.join(self.output_dir, f"{job.job_id}_final.png"), final)}
+        if underbase is not None:
+            artifacts["underbase"] = (os.path.join(self.output_dir, f"{job.job_id}_underbase.png"), underbase)
+        if self.layered_output:
+            layers = [final] + ([underbase] if underbase is not None else [])
+            artifacts["layered"] = (os.path.join(self.output_dir, f"{job.job_id}_layers.tiff"), layers)
+        return artifacts
+
+def write_artifacts(artifacts: Dict[str, Tuple[str, Any]], png_compress_level: int = 6) -> Dict[str, Dict[str, Any]]:
+    """
+    Write output artifacts concurrently (Pillow releases the GIL while
+    encoding). Each value is (path, payload): an Image is encoded as PNG, a
+    str is an already-encoded file to copy, a list is written as a
+    multi-page TIFF. Returns name -> {"path", "bytes", "encode_time"}.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, len(artifacts))) as executor:
+        futures = {name: executor.submit(_write_artifact, path, payload, png_compress_level)
+                   for name, (path, payload) in artifacts.items()}
+        written = {name: future.result() for name, future in futures.items()}
+    
+    logger.info("💾 Wrote " + ", ".join(f"{name} ({info['bytes'] / 1024:.0f} KB in {info['encode_time']:.2f}s)"
+                                       for name, info in written.items()))
+    return written
+
+def _write_artifact(path: str, payload, png_compress_level: int) -> Dict[str, Any]:
+    start_time = time.time()
+    if isinstance(payload, str):
+        shutil.copy2(payload, path)
+    elif isinstance(payload, list):
+        # save() keeps its encoder settings on the Image object, so pages shared
+        # with a concurrent PNG write get their own copy
+        layers = [Image.open(layer) if isinstance(layer, str) else layer.copy() for layer in payload]
+        layers[0].save(path, 'TIFF', save_all=True, append_images=layers[1:], compression='tiff_adobe_deflate')
+    else:
+        payload.save(path, 'PNG', compress_level=png_compress_level)
+    return {"path": path, "bytes": os.path.getsize(path), "encode_time": time.time() - start_time}
+
+def effective_ppi_at(width: int, height: int, target_size_in: Dict[str, float]) -> float:
+    """Pixels per inch when a width x height image is printed at target_size_in."""
+    target_w = target_size_in.get('w', 10)
+    target_h = target_size_in.get('h', 10)
+    return min(width / target_w, height / target_h)
+
+def underbase_choke_px(choke_pt: float, dpi: float) -> int:
+    """Choke radius in pixels for a choke of choke_pt points at dpi (at least 1)."""
+    return max(1, int(round(choke_pt * dpi / 72)))
+
+def quality_report(issues: List[str], warnings: List[str]) -> Dict[str, Any]:
+    """Validation result dict: blocking issues fail, each warning costs 5 points."""
+    return {
+        "passed": len(issues) == 0,
+        "issues": issues,
+        "warnings": warnings,
+        "quality_score": max(0, 100 - len(issues) * 25 - len(warnings) * 5)
+    }
 
-def scrape_and_process_logo(url: str, job: JobManifest, pipeline: EnhancedLogoPipeline) -> Dict[str, Any]:
+def _count_cache(cache_stats: Dict[str, Any], stage: str, outcome: str):
+    """Record a stage cache hit or miss in a results["cache"] dict."""
+    cache_stats.setdefault("stages", {})[stage] = outcome
+    counter = "hits" if outcome == "hit" else "misses"
+    cache_stats[counter] = cache_stats.get(counter, 0) + 1
+
+def available_cores() -> int:
+    """CPU cores this process may run on (respects affinity masks and cpusets)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+_batch_pipeline = None
+
+def _init_batch_worker(output_dir, temp_dir, options):
+    """Pool initializer: one warmed-up pipeline per worker process."""
+    global _batch_pipeline
+    # One OpenCV thread per worker - the pool already uses every core
+    cv2.setNumThreads(1)
+    # Per-worker temp dir so intermediate files of different jobs never collide
+    worker_temp_dir = temp_dir if options["in_memory"] else os.path.join(temp_dir, f"worker_{os.getpid()}")
+    _batch_pipeline = EnhancedLogoPipeline(output_dir, worker_temp_dir, **options)
+    _batch_pipeline.warm_up()
+
+def _process_batch_item(item):
+    image_path, job, submitted_at = item
+    queue_time = time.time() - submitted_at
+    result = _batch_pipeline.process_logo_complete(image_path, job)
+    result["worker_pid"] = os.getpid()
+    result["queue_time"] = queue_time
+    result["bg_removal_stats"] = dict(BG_REMOVAL_STATS)
+    return result
+
+def scrape_and_process_logo(url: str, job: JobManifest, pipeline: EnhancedLogoPipeline,
+                            scraper_mode: str = "fork") -> Dict[str, Any]:
     """
-    Complete pipeline: scrape logo from website and process it
+    Complete pipeline: scrape logo from website and process it.
+    scraper_mode selects the BulletproofScraper engine ("fork", "persistent" or "async").
     """
     # Import bulletproof scraper from current directory
     try:
@@ -610,11 +1346,14 @@ def scrape_and_process_logo(url: str, job: JobManifest, pipeline: EnhancedLogoPi
                 "scrape_result": None
             }
             
-    scraper = BulletproofScraper()
-    scrape_result = scraper.scrape_website(url)
+    scraper = BulletproofScraper(mode=scraper_mode)
+    try:
+        scrape_result = scraper.scrape_website(url)
+    finally:
+        scraper.close()
     
     if not scrape_result.get("logo_path"):
-            return {
+        return {
             "success": False,
             "error": f"Failed to scrape logo: {scrape_result.get('error', 'Unknown error')}",
             "scrape_result": scrape_result
@@ -673,5 +1412,43 @@ def test_enhanced_pipeline():
                 if validation.get('warnings'):
                     print(f"   Warnings: {', '.join(validation['warnings'])}")
 
+def test_svg_first_page():
+    """A page whose best-ranked candidate is an inline <svg> still yields a processed raster logo"""
+    import tempfile
+    import functools
+    from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+    
+    with tempfile.TemporaryDirectory() as root:
+        site_dir = os.path.join(root, "site")
+        os.makedirs(site_dir)
+        Image.new('RGB', (600, 300), (20, 60, 200)).save(os.path.join(site_dir, "brand.png"))
+        with open(os.path.join(site_dir, "index.html"), "w") as f:
+            f.write('<html><body><header><a href="/"><svg class="logo" viewBox="0 0 60 30">'
+                    '<rect width="60" height="30" fill="#1438c8"/></svg></a></header>'
+                    '<main><img src="/brand.png" alt="Acme logo"></main></body></html>')
+        
+        class QuietHandler(SimpleHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+        
+        server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=site_dir))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        cwd = os.getcwd()
+        os.chdir(root)  # the scraper writes bulletproof_output/ in the working directory
+        try:
+            job = JobManifest(job_id="svg_first", method=PrintMethod.DTF,
+                              target_size_in={"w": 2.0, "h": 1.0, "lock": "max"}, dpi_min=150)
+            pipeline = EnhancedLogoPipeline(os.path.join(root, "out"), os.path.join(root, "tmp"))
+            result = scrape_and_process_logo(f"http://127.0.0.1:{server.server_port}/", job, pipeline)
+        finally:
+            os.chdir(cwd)
+            server.shutdown()
+            server.server_close()
+        
+        assert result["scrape_result"]["logo_path"].endswith(".png"), result["scrape_result"]
+        assert "error" not in result, result.get("error")
+        assert os.path.exists(result["processed_files"]["final"])
+    print("✅ SVG-first page processed from its raster candidate")
+
 if __name__ == "__main__":
     test_enhanced_pipeline() 
\ No newline at end of file
@@ -5,35 +5,260 @@ Bulletproof Logo Scraper - Addresses Root Causes of Hanging
 This scraper fixes the fundamental issues that cause hanging:
 1. Process isolation - each request runs in separate process
 2. Hard process timeouts - kill hanging processes
-3. DNS pre-resolution with timeout
-4. Connection isolation - no connection reuse
+3. DNS pre-resolution with timeout, cached (including failures) across workers
+4. Connection pooling - keep-alive per host within a worker, strict timeouts kept
 5. Resource cleanup - prevent resource leaks
+6. Bounded worker pool - many sites in flight, each with its own hard timeout
+7. Persistent workers - optional pre-forked pool that imports once per worker
+8. Async engine - optional asyncio/aiohttp mode with per-phase deadlines
+9. Result store - skip domains solved recently, back off transient failures
 """
 
 import os
 import sys
 import time
+import json
+import codecs
 import socket
+import sqlite3
+import hashlib
+import asyncio
+import ipaddress
+import threading
 import signal
 import multiprocessing
-from multiprocessing import Process, Queue
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Process, Queue, Pipe
+from multiprocessing.connection import wait
 from urllib.parse import urlparse, urljoin
+from html.parser import HTMLParser
 import logging
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def scrape_single_website_isolated(url, result_queue, output_dir="bulletproof_logos", timeout=15):
+# Optional async engine dependency
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    aiohttp = None
+    AIOHTTP_AVAILABLE = False
+
+# Page bytes read before logo discovery gives up on the rest of the document
+PAGE_BYTE_BUDGET = 512 * 1024
+
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Cache-Control': 'no-cache'
+}
+
+# System resolver, kept so the cache can call it after patching socket.getaddrinfo
+_system_getaddrinfo = socket.getaddrinfo
+
+class DNSCache:
+    """
+    Resolver cache shared by all scraper workers (and runs) through a SQLite file.
+    
+    Answers are kept for `ttl` seconds. Failures are cached too: NXDOMAIN-style
+    errors for `negative_ttl`, transient ones (EAI_AGAIN, timeouts) for
+    `transient_ttl`, so dead domains fail instantly on re-runs.
+    """
+    
+    PERMANENT_ERRNOS = {socket.EAI_NONAME} | ({socket.EAI_NODATA} if hasattr(socket, 'EAI_NODATA') else set())
+    
+    def __init__(self, path, ttl=3600, negative_ttl=6 * 3600, transient_ttl=120):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.transient_ttl = transient_ttl
+        self.hits = 0
+        self.misses = 0
+        self._memory = {}  # host -> (addresses, error, errno, expires)
+        self._conn = None
+        self._conn_pid = None
+        self._lock = threading.Lock()
+    
+    def _db(self):
+        # Reopen after fork: SQLite connections must not cross processes
+        if self._conn is None or self._conn_pid != os.getpid():
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS dns_cache ("
+                "host TEXT PRIMARY KEY, addresses TEXT, error TEXT, errno INTEGER, expires REAL)"
+            )
+            self._conn, self._conn_pid = conn, os.getpid()
+        return self._conn
+    
+    def _load(self, host):
+        try:
+            with self._lock:
+                row = self._db().execute(
+                    "SELECT addresses, error, errno, expires FROM dns_cache WHERE host = ?", (host,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.debug(f"DNS cache read failed: {e}")
+            return None
+        if row is None:
+            return None
+        return (json.loads(row[0] or "[]"), row[1], row[2], row[3])
+    
+    def _store(self, host, entry):
+        self._memory[host] = entry
+        addresses, error, errno, expires = entry
+        try:
+            with self._lock:
+                conn = self._db()
+                conn.execute(
+                    "INSERT OR REPLACE INTO dns_cache (host, addresses, error, errno, expires) VALUES (?, ?, ?, ?, ?)",
+                    (host, json.dumps(addresses), error, errno, expires)
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.debug(f"DNS cache write failed: {e}")
+    
+    def resolve(self, host):
+        """Return the host's IP addresses, raising socket.gaierror for (cached) failures."""
+        host = host.lower().rstrip('.')
+        now = time.time()
+        entry = self._memory.get(host)
+        if entry is None or entry[3] <= now:
+            entry = self._load(host)
+        
+        if entry is not None and entry[3] > now:
+            self.hits += 1
+            self._memory[host] = entry
+            addresses, error, errno, _ = entry
+            if error:
+                raise socket.gaierror(errno, error)
+            return list(addresses)
+        
+        self.misses += 1
+        try:
+            infos = _system_getaddrinfo(host, None, 0, socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            cache_for = self.negative_ttl if e.errno in self.PERMANENT_ERRNOS else self.transient_ttl
+            self._store(host, ([], e.strerror or str(e), e.errno, now + cache_for))
+            raise
+        except socket.timeout as e:
+            self._store(host, ([], "timed out", socket.EAI_AGAIN, now + self.transient_ttl))
+            raise socket.gaierror(socket.EAI_AGAIN, "timed out") from e
+        
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        self._store(host, (addresses, None, None, now + self.ttl))
+        return addresses
+    
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        """Drop-in replacement for socket.getaddrinfo backed by the cache."""
+        if not isinstance(host, str) or not (port is None or isinstance(port, int)) or _is_ip_literal(host):
+            return _system_getaddrinfo(host, port, family, type, proto, flags)
+        
+        results = []
+        for address in self.resolve(host):
+            address_family = socket.AF_INET6 if ':' in address else socket.AF_INET
+            if family not in (0, socket.AF_UNSPEC, address_family):
+                continue
+            sockaddr = (address, port or 0) if address_family == socket.AF_INET else (address, port or 0, 0, 0)
+            results.append((address_family, type or socket.SOCK_STREAM, proto or socket.IPPROTO_TCP, '', sockaddr))
+        if not results:
+            return _system_getaddrinfo(host, port, family, type, proto, flags)
+        return results
+    
+    def install(self):
+        """Route this process's socket.getaddrinfo (requests/urllib3 included) through the cache."""
+        socket.getaddrinfo = self.getaddrinfo
+
+def _is_ip_literal(host):
+    try:
+        ipaddress.ip_address(host.strip('[]'))
+        return True
+    except ValueError:
+        return False
+
+_process_dns_caches = {}
+
+def get_dns_cache(path):
+    """Per-process DNSCache for `path`, installed as the process resolver on first use."""
+    cache = _process_dns_caches.get((path, os.getpid()))
+    if cache is None:
+        cache = DNSCache(path)
+        cache.install()
+        _process_dns_caches[(path, os.getpid())] = cache
+    return cache
+
+if AIOHTTP_AVAILABLE:
+    class CachedResolver(aiohttp.abc.AbstractResolver):
+        """
+        aiohttp resolver that answers from a DNSCache (the system resolver when
+        cache is None); lookups run on `executor` (None = the loop's default).
+        """
+        
+        def __init__(self, cache, executor=None):
+            self.cache = cache
+            self.executor = executor
+        
+        async def resolve(self, host, port=0, family=socket.AF_INET):
+            loop = asyncio.get_running_loop()
+            getaddrinfo = self.cache.getaddrinfo if self.cache is not None else _system_getaddrinfo
+            infos = await loop.run_in_executor(
+                self.executor, getaddrinfo, host, port, family, socket.SOCK_STREAM
+            )
+            return [
+                {"hostname": host, "host": info[4][0], "port": info[4][1],
+                 "family": info[0], "proto": info[2], "flags": socket.AI_NUMERICHOST}
+                for info in infos
+            ]
+        
+        async def close(self):
+            pass
+
+def _http_sessions():
+    """The shared session module, imported lazily like requests."""
+    try:
+        from . import http_sessions
+    except ImportError:
+        import http_sessions
+    return http_sessions
+
+def _cached_get(url, http_cache_dir=None, cache_stats=None, read_body=None, keep_partial=False, **kwargs):
+    """
+    GET on the worker's pooled session, through the ResponseCache when enabled.
+    read_body(response) -> bytes streams successful bodies (see LogoStream).
+    keep_partial caches (and serves) the prefix read_body stopped at.
+    """
+    http_sessions = _http_sessions()
+    session = http_sessions.get_session()
+    if http_cache_dir:
+        return http_sessions.get_response_cache(http_cache_dir).get(
+            session, url, cache_stats, read_body=read_body, keep_partial=keep_partial, **kwargs
+        )
+    if read_body is None:
+        return session.get(url, **kwargs)
+    kwargs["stream"] = True
+    response = session.get(url, **kwargs)
+    if response.status_code == 200:
+        http_sessions.read_into(response, read_body)
+    return response
+
+def scrape_single_website_isolated(url, result_queue, output_dir="bulletproof_logos", timeout=15, dns_cache_path=None,
+                                   http_cache_dir=None, page_byte_budget=PAGE_BYTE_BUDGET):
     """
     Scrape a single website in complete isolation.
     This runs in a separate process to prevent hanging the main thread.
+    With dns_cache_path, lookups go through the shared DNSCache; with
+    http_cache_dir, page and logo bodies are revalidated from a ResponseCache.
+    With page_byte_budget, the page is streamed through a LogoPageScanner and
+    the download stops once the logo is found (None reads the whole page).
     """
     try:
         # Import here to avoid issues with multiprocessing
         import requests
-        from bs4 import BeautifulSoup
-        import re
         
         # Parse domain info
         if not url.startswith(('http://', 'https://')):
@@ -45,7 +270,10 @@ def scrape_single_website_isolated(url, result_queue, output_dir="bulletproof_lo
         # Step 1: DNS resolution with timeout
         try:
             socket.setdefaulttimeout(3)  # 3 second DNS timeout
-            socket.gethostbyname(domain)
+            if dns_cache_path:
+                get_dns_cache(dns_cache_path).resolve(urlparse(url).hostname)
+            else:
+                socket.gethostbyname(urlparse(url).hostname)
         except (socket.gaierror, socket.timeout) as e:
             result_queue.put({
                 "company_name": company_name,
@@ -56,41 +284,44 @@ def scrape_single_website_isolated(url, result_queue, output_dir="bulletproof_lo
             return
         
         # Step 2: HTTP request with aggressive timeouts
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Connection': 'close',  # No keep-alive
-            'Cache-Control': 'no-cache'
-        }
-        
-        # Use very aggressive timeouts and no session (fresh connection)
-        response = requests.get(
+        # Pooled keep-alive session so the logo fetch can reuse this connection
+        cache_stats = {}
+        scanner = LogoPageScanner(url, page_byte_budget) if page_byte_budget else None
+        response = _cached_get(
             url,
-            headers=headers,
+            http_cache_dir,
+            cache_stats,
+            read_body=(lambda r: read_stream_body(r, scanner)) if scanner else None,
+            keep_partial=scanner is not None,  # a scan that stopped early still saw the logo
+            headers=REQUEST_HEADERS,
             timeout=(2, 8),  # 2s connect, 8s read
             verify=False,
-            allow_redirects=True,
-            stream=False  # Get all data at once
+            allow_redirects=True
         )
         response.raise_for_status()
         
-        # Step 3: Parse HTML quickly
-        soup = BeautifulSoup(response.text, 'html.parser')
+        # Step 3: Parse HTML quickly and rank logo candidates
+        # (the scanner has already ranked them unless the page came from cache)
+        if scanner is not None:
+            if scanner.candidates is None:
+                rescan_page(scanner, response.content, response.encoding)
+            candidates = scanner.candidates
+        else:
+            candidates = find_logo_candidates(response.text, url)
         
-        # Step 4: Find logo with simplified but effective method
-        logo_url = find_logo_fast(soup, url)
-        logo_path = None
-        
-        if logo_url:
-            logo_path = download_logo_fast(logo_url, company_name, output_dir, timeout=5)
+        # Step 4: Download the best candidate that turns out to be an image
+        logo_path, logo_url = download_best_logo(candidates, company_name, output_dir, timeout=5,
+                                                 http_cache_dir=http_cache_dir, cache_stats=cache_stats)
         
         # Return result
         result_queue.put({
             "company_name": company_name,
             "url": url,
             "logo_path": logo_path,
-            "error": None
+            "logo_url": logo_url,
+            "error": None,
+            "cache": cache_stats,
+            "page_bytes": len(response.content)
         })
         
     except requests.exceptions.Timeout:
@@ -115,123 +346,1097 @@ def scrape_single_website_isolated(url, result_queue, output_dir="bulletproof_lo
             "error": str(e)
         })
 
-def find_logo_fast(soup, base_url):
-    """Fast logo detection focusing on most common patterns."""
-    # High-probability selectors in order of likelihood
-    selectors = [
-        'img[alt*="logo" i]',
-        '.logo img', '#logo img',
-        'img[class*="logo" i]',
-        'img[src*="logo" i]', 
-        'header img:first-child',
-        'nav img:first-child',
-        '.navbar-brand img',
-        '.site-logo img'
-    ]
+# Prefer lxml for parsing when it is installed; it is several times faster
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.svg', '.webp', '.gif', '.ico')
+# Words that usually mark someone else's logo or decorative art
+LOGO_NEGATIVE_WORDS = ('banner', 'hero', 'slide', 'sprite', 'partner', 'client', 'sponsor',
+                       'payment', 'badge', 'award', 'social', 'facebook', 'twitter', 'instagram')
+# Score at which a header-only parse is trusted without parsing the rest of the page
+LOGO_CONFIDENT_SCORE = 60
+# Ranked candidates tried before giving up on a site
+LOGO_MAX_ATTEMPTS = 3
+
+def _attr_text(el, *names):
+    parts = []
+    for name in names:
+        value = el.get(name)
+        if isinstance(value, list):
+            value = ' '.join(value)
+        if value:
+            parts.append(value)
+    return ' '.join(parts).lower()
+
+def _int_attr(el, name):
+    try:
+        return int(str(el.get(name, '')).strip().rstrip('px'))
+    except ValueError:
+        return None
+
+def _int_attr_text(text):
+    return int(text) if text.strip().isdigit() else 0
+
+def _ancestor_context(el):
+    """One walk up the tree: header/nav membership, logo-ish wrappers, home link."""
+    context = {"header": False, "nav": False, "logo_wrapper": False, "home_link": False}
+    for parent in el.parents:
+        name = parent.name
+        if name is None or name == '[document]':
+            break
+        if name == 'header' or 'banner' in _attr_text(parent, 'role'):
+            context["header"] = True
+        elif name == 'nav':
+            context["nav"] = True
+        elif name == 'a' and parent.get('href', '').strip() in ('/', '#', './', 'index.html'):
+            context["home_link"] = True
+        wrapper = _attr_text(parent, 'class', 'id')
+        if 'logo' in wrapper or 'brand' in wrapper:
+            context["logo_wrapper"] = True
+    return context
+
+def _score_img(el, index):
+    src = el.get('src') or ''
+    # Lazy-loaded images keep the real URL in a data attribute
+    for lazy in ('data-src', 'data-lazy-src', 'data-original'):
+        if el.get(lazy) and (not src or src.startswith('data:')):
+            src = el.get(lazy)
+    if not src or src.startswith('data:'):
+        return None, 0
     
-    for selector in selectors:
-        try:
-            elements = soup.select(selector)
-            for img in elements:
-                src = img.get('src', '')
-                if src:
-                    # Make absolute URL
-                    if not src.startswith(('http://', 'https://')):
-                        src = urljoin(base_url, src)
-                    
-                    # Quick validation - must be reasonable image URL
-                    if any(ext in src.lower() for ext in ['.png', '.jpg', '.jpeg', '.svg', '.webp']):
-                        return src
-        except:
-            continue
+    alt, ident, src_l = _attr_text(el, 'alt', 'title'), _attr_text(el, 'class', 'id'), src.lower()
+    context = _ancestor_context(el)
+    score = 0
+    score += 40 if 'logo' in alt else 0
+    score += 35 if 'logo' in ident else 0
+    score += 30 if 'logo' in src_l else 0
+    score += 25 if context["logo_wrapper"] else 0
+    score += 20 if context["header"] else 0
+    score += 15 if context["nav"] else 0
+    score += 15 if context["home_link"] else 0
+    score += max(0, 10 - index)  # earlier in the document is better
+    
+    width, height = _int_attr(el, 'width'), _int_attr(el, 'height')
+    if width and height:
+        if width < 16 or height < 16:
+            score -= 40  # tracking pixels and tiny icons
+        elif 1.5 <= width / height <= 8:
+            score += 5  # typical wordmark proportions
+    if width and width > 1200:
+        score -= 15
+    if any(word in alt or word in ident or word in src_l for word in LOGO_NEGATIVE_WORDS):
+        score -= 25
+    if not any(ext in src_l for ext in IMAGE_EXTENSIONS):
+        score -= 20
+    return src, score
+
+def _score_svg(el, index):
+    label = _attr_text(el, 'class', 'id', 'aria-label') + ' ' + (el.title.get_text().lower() if el.title else '')
+    context = _ancestor_context(el)
+    score = 10
+    score += 35 if 'logo' in label else 0
+    score += 25 if context["logo_wrapper"] else 0
+    score += 20 if context["header"] else 0
+    score += 15 if context["nav"] else 0
+    score += 15 if context["home_link"] else 0
+    score += max(0, 10 - index)
+    if not (context["header"] or context["nav"] or context["logo_wrapper"] or 'logo' in label):
+        return 0  # inline icons elsewhere on the page
+    if el.find('use') is not None and not el.find(['path', 'polygon', 'rect', 'circle', 'text']):
+        return 0  # sprite reference that will not render standalone
+    return score
+
+# HTML parsers lowercase names, but SVG is case-sensitive
+SVG_CAMEL_CASE_NAMES = (
+    'viewBox', 'preserveAspectRatio', 'gradientUnits', 'gradientTransform', 'patternUnits',
+    'patternTransform', 'clipPathUnits', 'maskUnits', 'stdDeviation', 'textLength',
+    'linearGradient', 'radialGradient', 'clipPath', 'textPath', 'foreignObject',
+    'feGaussianBlur', 'feOffset', 'feBlend', 'feColorMatrix', 'feFlood', 'feComposite', 'feMerge', 'feMergeNode',
+)
+
+def _svg_markup(el):
+    """Standalone markup for an inline <svg> element."""
+    import re
+    
+    markup = str(el)
+    for name in SVG_CAMEL_CASE_NAMES:
+        lower = name.lower()
+        markup = re.sub(rf'(?<=[\s<]){lower}(?=[\s=>/])', name, markup)
+        markup = markup.replace(f'</{lower}>', f'</{name}>')
+    if 'xmlns=' not in markup:
+        markup = markup.replace('<svg', '<svg xmlns="http://www.w3.org/2000/svg"', 1)
+    return markup
+
+def rank_logo_candidates(soup, base_url):
+    """
+    Score every logo candidate in one pass over the document.
+    
+    Considers <img>, <link rel=icon/apple-touch-icon>, og:image and inline
+    <svg>, weighting alt/class/src text, header/nav placement, logo-ish
+    wrappers, home links, document position and size hints. Returns a list
+    of {"url", "svg", "score", "source"} dicts, best first; "svg" holds the
+    markup of inline SVG candidates (their "url" is None).
+    """
+    candidates = []
+    img_index = svg_index = 0
+    
+    for el in soup.find_all(['img', 'link', 'meta', 'svg']):
+        name = el.name
+        if name == 'img':
+            src, score = _score_img(el, img_index)
+            img_index += 1
+            if src:
+                candidates.append({"url": urljoin(base_url, src), "svg": None, "score": score, "source": "img"})
+        elif name == 'link':
+            rel = _attr_text(el, 'rel')
+            href = el.get('href')
+            if not href or 'icon' not in rel:
+                continue
+            size = max([_int_attr_text(s) for s in str(el.get('sizes', '')).lower().split('x')] + [0])
+            score = (25 if 'apple-touch-icon' in rel else 10) + min(15, size // 16)
+            candidates.append({"url": urljoin(base_url, href), "svg": None, "score": score, "source": "icon"})
+        elif name == 'meta':
+            prop = _attr_text(el, 'property', 'name')
+            content = el.get('content')
+            if content and prop in ('og:image', 'og:logo', 'twitter:image'):
+                score = 15 + (20 if 'logo' in content.lower() or prop == 'og:logo' else 0)
+                candidates.append({"url": urljoin(base_url, content), "svg": None, "score": score, "source": prop})
+        elif name == 'svg' and el.find_parent('svg') is None:
+            score = _score_svg(el, svg_index)
+            svg_index += 1
+            if score > 0:
+                candidates.append({"url": None, "svg": _svg_markup(el), "score": score, "source": "svg"})
+    
+    # Stable sort keeps document order between equal scores
+    ranked = sorted((c for c in candidates if c["score"] > 0), key=lambda c: -c["score"])
+    seen, unique = set(), []
+    for candidate in ranked:
+        key = candidate["url"] or candidate["svg"]
+        if key not in seen:
+            seen.add(key)
+            unique.append(candidate)
+    return unique
+
+def find_logo_candidates(html, base_url):
+    """
+    Parse a page and rank its logo candidates.
+    Only the markup up to </header> is parsed first; the full page is parsed
+    when that prefix has no confident candidate.
+    """
+    from bs4 import BeautifulSoup
+    
+    header_end = html.lower().find('</header>')
+    if header_end != -1:
+        prefix = html[:header_end + len('</header>')]
+        candidates = rank_logo_candidates(BeautifulSoup(prefix, HTML_PARSER), base_url)
+        if candidates and candidates[0]["score"] >= LOGO_CONFIDENT_SCORE:
+            return candidates
     
+    return rank_logo_candidates(BeautifulSoup(html, HTML_PARSER), base_url)
+
+def find_logo_fast(soup, base_url):
+    """Best-scoring logo image URL in a parsed page, or None."""
+    for candidate in rank_logo_candidates(soup, base_url):
+        if candidate["url"]:
+            return candidate["url"]
     return None
 
-def download_logo_fast(logo_url, company_name, output_dir="bulletproof_logos", timeout=5):
-    """Fast logo download with minimal processing."""
+class _CheckpointParser(HTMLParser):
+    """Incremental tag watcher: flags the points where ranking the prefix is worthwhile."""
+    
+    CHECKPOINT_END_TAGS = ('header', 'nav')
+    CHECKPOINT_START_TAGS = ('main', 'article')
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.checkpoint = False
+    
+    def handle_starttag(self, tag, attrs):
+        if tag in self.CHECKPOINT_START_TAGS:
+            self.checkpoint = True
+    
+    def handle_endtag(self, tag):
+        if tag in self.CHECKPOINT_END_TAGS:
+            self.checkpoint = True
+
+class LogoPageScanner:
+    """
+    Incremental page reader for logo discovery.
+    
+    feed() raw chunks as they arrive. They are decoded and run through an
+    incremental HTML parser; whenever the header or nav closes (or main
+    content starts) the prefix read so far is ranked. feed() returns True once
+    a candidate reaches LOGO_CONFIDENT_SCORE or byte_budget is used, so the
+    caller can drop the connection. `candidates` holds the ranked list.
+    """
+    
+    def __init__(self, base_url, byte_budget=PAGE_BYTE_BUDGET):
+        self.base_url = base_url
+        self.byte_budget = byte_budget
+        self.raw = bytearray()
+        self.candidates = None
+        self._text = []
+        self._ranked_parts = 0
+        self._decoder = None
+        self._parser = _CheckpointParser()
+    
+    def begin(self, content_type, content_length):
+        """Called with the response headers before the first chunk."""
+        self._decoder = codecs.getincrementaldecoder(_codec_or_utf8(charset_from_content_type(content_type)))(errors='replace')
+    
+    def feed(self, chunk):
+        if self._decoder is None:
+            self.begin(None, None)
+        self.raw += chunk
+        text = self._decoder.decode(chunk)
+        self._text.append(text)
+        self._parser.feed(text)
+        
+        if self._parser.checkpoint:
+            self._parser.checkpoint = False
+            self._rank()
+            if self.candidates and self.candidates[0]["score"] >= LOGO_CONFIDENT_SCORE:
+                return True
+        return len(self.raw) >= self.byte_budget
+    
+    def finish(self):
+        """Rank whatever was read since the last checkpoint and return the bytes read."""
+        if self._ranked_parts != len(self._text) or self.candidates is None:
+            self._rank()
+        return bytes(self.raw)
+    
+    def _rank(self):
+        from bs4 import BeautifulSoup
+        
+        self._ranked_parts = len(self._text)
+        self.candidates = rank_logo_candidates(BeautifulSoup(''.join(self._text), HTML_PARSER), self.base_url)
+
+def rescan_page(scanner, body, encoding=None):
+    """Rank a page body served from cache - often just the prefix an earlier scan stopped at."""
+    scanner.begin(f"text/html; charset={encoding or 'utf-8'}", len(body))
+    scanner.feed(body)
+    scanner.finish()
+    return scanner.candidates
+
+def _codec_or_utf8(name):
     try:
-        import requests
-        import re
+        codecs.lookup(name)
+        return name
+    except LookupError:
+        return 'utf-8'
+
+# Logo download caps: stop reading once either is passed
+LOGO_MAX_BYTES = 5 * 1024 * 1024
+LOGO_MAX_PIXELS = 25_000_000
+# Bytes searched for the image header before giving up on early size checks
+LOGO_HEADER_PROBE_BYTES = 256 * 1024
+
+def sniff_image_format(head):
+    """Identify a logo from its first bytes: 'png', 'jpeg', 'gif', 'webp', 'bmp', 'ico', 'avif', 'svg' or None."""
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if head.startswith((b'GIF87a', b'GIF89a')):
+        return 'gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    if head.startswith(b'BM'):
+        return 'bmp'
+    if head.startswith(b'\x00\x00\x01\x00'):
+        return 'ico'
+    if head[4:8] == b'ftyp' and head[8:12] in (b'avif', b'avis'):
+        return 'avif'
+    text = head[:1024].lstrip(b'\xef\xbb\xbf \t\r\n').lower()
+    if text.startswith(b'<') and b'<svg' in text:
+        return 'svg'
+    return None
+
+class LogoStream:
+    """
+    Incremental logo body reader.
+    
+    feed() each chunk as it arrives: the format is sniffed from the first
+    bytes, raster dimensions are read from the header as soon as it is
+    complete, and ValueError is raised once max_bytes, max_pixels or the
+    deadline is passed, or the body is clearly not an image.
+    """
+    
+    def __init__(self, max_bytes=LOGO_MAX_BYTES, max_pixels=LOGO_MAX_PIXELS, deadline=None):
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.deadline = deadline
+        self.buffer = bytearray()
+        self.format = None
+        self.size = None
+    
+    def begin(self, content_type, content_length):
+        """Called with the response headers before the first chunk."""
+        if content_length and content_length > self.max_bytes:
+            raise ValueError(f"Logo larger than {self.max_bytes} bytes ({content_length})")
+    
+    def feed(self, chunk):
+        """Add a chunk; returns False (a logo is always read to the end)."""
+        self.buffer += chunk
+        if len(self.buffer) > self.max_bytes:
+            raise ValueError(f"Logo larger than {self.max_bytes} bytes")
+        if self.deadline is not None and time.time() > self.deadline:
+            raise ValueError("Logo download exceeded its time budget")
+        if self.format is None and len(self.buffer) >= 1024:
+            self._sniff()
+        if self.format not in (None, 'svg') and self.size is None and len(self.buffer) <= LOGO_HEADER_PROBE_BYTES:
+            self._probe_size()
+        return False
+    
+    def finish(self):
+        """Return the full body once the stream ends."""
+        if self.format is None:
+            self._sniff()
+        if self.format != 'svg' and self.size is None:
+            self._probe_size()
+        return bytes(self.buffer)
+    
+    def _sniff(self):
+        self.format = sniff_image_format(bytes(self.buffer[:1024]))
+        if self.format is None:
+            raise ValueError("Logo URL did not return an image")
+    
+    def _probe_size(self):
         from PIL import Image
         from io import BytesIO
         
-        # Create safe filename
-        safe_name = re.sub(r'[^\w\s-]', '', company_name)
-        safe_name = re.sub(r'[-\s]+', '_', safe_name)
+        # Image.open only parses the header; it fails until the header is complete
+        try:
+            self.size = Image.open(BytesIO(bytes(self.buffer))).size
+        except Exception:
+            return
+        if self.size[0] * self.size[1] > self.max_pixels:
+            raise ValueError(f"Logo is {self.size[0]}x{self.size[1]}, over the {self.max_pixels} pixel cap")
+
+def charset_from_content_type(content_type, default='utf-8'):
+    """Charset parameter of a Content-Type header, or `default`."""
+    for param in (content_type or '').split(';')[1:]:
+        key, _, value = param.partition('=')
+        if key.strip().lower() == 'charset' and value.strip():
+            return value.strip().strip('"\'')
+    return default
+
+def read_stream_body(response, stream):
+    """
+    Feed a requests response to a LogoStream / LogoPageScanner chunk by chunk.
+    If the stream stops early, the connection is dropped and response.partial
+    is set so the truncated body is never cached.
+    """
+    length = response.headers.get('Content-Length', '')
+    stream.begin(response.headers.get('Content-Type'), int(length) if length.isdigit() else None)
+    for chunk in response.iter_content(chunk_size=16384):
+        if stream.feed(chunk):
+            response.partial = True
+            response.close()
+            break
+    return stream.finish()
+
+def read_logo_body(response, max_bytes=LOGO_MAX_BYTES, max_pixels=LOGO_MAX_PIXELS, timeout=None):
+    """Stream a requests response through LogoStream and return the body."""
+    return read_stream_body(response, LogoStream(max_bytes, max_pixels, time.time() + timeout if timeout else None))
+
+def logo_output_path(company_name, output_dir="bulletproof_logos", ext="png"):
+    """Return the path a company's logo is saved to (creating output_dir)."""
+    import re
+    
+    # Create safe filename
+    safe_name = re.sub(r'[^\w\s-]', '', company_name)
+    safe_name = re.sub(r'[-\s]+', '_', safe_name)
+    
+    # Create output directory
+    os.makedirs(output_dir, exist_ok=True)
+    return os.path.join(output_dir, f"{safe_name}_logo.{ext}")
+
+def save_logo_bytes(data, company_name, output_dir="bulletproof_logos"):
+    """
+    Convert downloaded logo bytes to an RGBA PNG (raw bytes if not decodable).
+    SVGs are written as-is to a .svg file; rasterizing is left to the pipeline.
+    """
+    from PIL import Image
+    from io import BytesIO
+    
+    if sniff_image_format(data[:1024]) == 'svg':
+        filepath = logo_output_path(company_name, output_dir, ext="svg")
+        with open(filepath, 'wb') as f:
+            f.write(data)
+        return filepath
+    
+    filepath = logo_output_path(company_name, output_dir)
+    
+    # Quick image processing
+    try:
+        img = Image.open(BytesIO(data))
         
-        # Create output directory
-        os.makedirs(output_dir, exist_ok=True)
-        filename = f"{safe_name}_logo.png"
-        filepath = os.path.join(output_dir, filename)
+        # Convert to PNG with transparency
+        if img.mode != 'RGBA':
+            img = img.convert('RGBA')
+        
+        # Resize if too large
+        if img.width > 800 or img.height > 800:
+            img.thumbnail((800, 800), Image.Resampling.LANCZOS)
+        
+        img.save(filepath, 'PNG', optimize=True)
+        return filepath
         
+    except Exception:
+        # Fallback: save raw data
+        with open(filepath, 'wb') as f:
+            f.write(data)
+        return filepath
+
+def download_logo_fast(logo_url, company_name, output_dir="bulletproof_logos", timeout=5,
+                       http_cache_dir=None, cache_stats=None):
+    """
+    Fast logo download with minimal processing.
+    The body is streamed through LogoStream, so oversized or non-image
+    responses are dropped as soon as they are recognised.
+    """
+    try:
         # Download with timeout
-        response = requests.get(
+        with _cached_get(
             logo_url,
-            headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'},
+            http_cache_dir,
+            cache_stats,
+            read_body=lambda response: read_logo_body(response, timeout=timeout),
+            headers={'User-Agent': REQUEST_HEADERS['User-Agent']},
             timeout=timeout,
-            verify=False,
-            stream=True
-        )
+            verify=False
+        ) as response:
+            response.raise_for_status()
+            return save_logo_bytes(response.content, company_name, output_dir)
+            
+    except Exception as e:
+        logger.debug(f"Logo download failed: {str(e)}")
+        return None
+
+def _is_svg_candidate(candidate):
+    return bool(candidate["svg"]) or urlparse(candidate["url"]).path.lower().endswith('.svg')
+
+def raster_first(candidates):
+    """
+    Ranked candidates reordered so raster images come before SVG ones (rank
+    kept within each group) - downstream processing needs pixels, and an
+    SVG is only worth saving when no raster candidate works.
+    """
+    return sorted(candidates, key=_is_svg_candidate)
+
+def download_best_logo(candidates, company_name, output_dir="bulletproof_logos", timeout=5,
+                       http_cache_dir=None, cache_stats=None):
+    """
+    Save the first of LOGO_MAX_ATTEMPTS candidates (raster_first order) that
+    yields an image. A download that turns out to be SVG is kept only as a
+    fallback while later candidates are tried.
+    Returns (logo_path, logo_url); logo_url is None for inline SVG.
+    """
+    fallback = (None, None)
+    for candidate in raster_first(candidates)[:LOGO_MAX_ATTEMPTS]:
+        if candidate["svg"]:
+            logo_path = save_logo_bytes(candidate["svg"].encode('utf-8'), company_name, output_dir)
+        else:
+            logo_path = download_logo_fast(candidate["url"], company_name, output_dir, timeout,
+                                           http_cache_dir, cache_stats)
+        if logo_path and not logo_path.endswith('.svg'):
+            return logo_path, candidate["url"]
+        if logo_path and fallback[0] is None:
+            fallback = (logo_path, candidate["url"])
+    return fallback
+
+async def download_best_logo_async(session, candidates, company_name, output_dir="bulletproof_logos", timeout=5,
+                                   response_cache=None, cache_stats=None, io_executor=None, cpu_executor=None):
+    """Async counterpart of download_best_logo (executors as in scrape_single_website_async)."""
+    loop = asyncio.get_running_loop()
+    fallback = (None, None)
+    for candidate in raster_first(candidates)[:LOGO_MAX_ATTEMPTS]:
+        if candidate["svg"]:
+            logo_path = await loop.run_in_executor(
+                cpu_executor, save_logo_bytes, candidate["svg"].encode('utf-8'), company_name, output_dir
+            )
+        else:
+            logo_path = await download_logo_async(session, candidate["url"], company_name, output_dir, timeout,
+                                                  response_cache, cache_stats, io_executor, cpu_executor)
+        if logo_path and not logo_path.endswith('.svg'):
+            return logo_path, candidate["url"]
+        if logo_path and fallback[0] is None:
+            fallback = (logo_path, candidate["url"])
+    return fallback
+
+async def _fetch_body_async(session, url, headers, headers_timeout, body_timeout,
+                            response_cache=None, cache_stats=None, body_stream=None, keep_partial=False,
+                            connect_timeout=None, io_executor=None, **kwargs):
+    """
+    GET url on an aiohttp session and return (body, encoding), revalidating
+    against response_cache (a ResponseCache) when one is given. With a
+    body_stream (LogoStream / LogoPageScanner) the body is read chunk by chunk
+    and reading stops as soon as the stream says so; keep_partial caches that
+    prefix so it can be revalidated and rescanned next time. connect_timeout
+    bounds opening a new connection on its own, inside headers_timeout.
+    Cache reads and writes (SQLite, object files, eviction) run on io_executor
+    (None = the loop's default) so they never stall the other sites on the loop.
+    """
+    if connect_timeout is not None:
+        kwargs["timeout"] = aiohttp.ClientTimeout(sock_connect=connect_timeout)
+    loop = asyncio.get_running_loop()
+    entry = await loop.run_in_executor(io_executor, response_cache.lookup, url) if response_cache else None
+    if entry and entry["partial"] and not keep_partial:
+        entry = None
+    if entry:
+        headers = {**headers, **response_cache.conditional_headers(entry)}
+        cache_stats["revalidations"] = cache_stats.get("revalidations", 0) + 1
+    
+    response = await asyncio.wait_for(session.get(url, headers=headers, ssl=False, **kwargs), headers_timeout)
+    async with response:
+        if response.status == 304 and entry:
+            body = await loop.run_in_executor(io_executor, response_cache.read_body, url, entry)
+            if body is not None:
+                cache_stats["hits"] = cache_stats.get("hits", 0) + 1
+                return body, charset_from_content_type(entry.get("content_type"))
+        
         response.raise_for_status()
+        partial = False
+        if body_stream is None:
+            body = await asyncio.wait_for(response.read(), body_timeout)
+            encoding = response.get_encoding()
+        else:
+            body_stream.begin(response.headers.get('Content-Type'), response.content_length)
+            
+            async def read_stream():
+                async for chunk in response.content.iter_chunked(16384):
+                    if body_stream.feed(chunk):
+                        return body_stream.finish(), True
+                return body_stream.finish(), False
+            
+            body, partial = await asyncio.wait_for(read_stream(), body_timeout)
+            encoding = charset_from_content_type(response.headers.get('Content-Type'))
+        if response_cache:
+            cache_stats["misses"] = cache_stats.get("misses", 0) + 1
+            if response.status == 200 and (keep_partial or not partial):
+                await loop.run_in_executor(io_executor, response_cache.store, url, response.headers, body,
+                                           str(response.url), partial)
+    return body, encoding
+
+async def download_logo_async(session, logo_url, company_name, output_dir="bulletproof_logos", timeout=5,
+                              response_cache=None, cache_stats=None, io_executor=None, cpu_executor=None):
+    """Async counterpart of download_logo_fast; image conversion runs on cpu_executor."""
+    try:
+        data, _ = await asyncio.wait_for(
+            _fetch_body_async(session, logo_url, {'User-Agent': REQUEST_HEADERS['User-Agent']}, timeout, timeout,
+                              response_cache, cache_stats, body_stream=LogoStream(), io_executor=io_executor),
+            timeout
+        )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cpu_executor, save_logo_bytes, data, company_name, output_dir)
+        
+    except Exception as e:
+        logger.debug(f"Logo download failed: {str(e)}")
+        return None
+
+async def scrape_single_website_async(url, session, output_dir="bulletproof_logos", timeout=15,
+                                      dns_timeout=3, connect_timeout=2, read_timeout=8, logo_timeout=5,
+                                      dns_cache=None, response_cache=None, page_byte_budget=PAGE_BYTE_BUDGET,
+                                      io_executor=None, cpu_executor=None):
+    """
+    Scrape a single website on the event loop.
+    
+    Same result dict as scrape_single_website_isolated (plus `duration`), but
+    each phase is bounded instead of killing a process: DNS (dns_timeout),
+    TCP connect (connect_timeout, as the socket connect timeout), connect +
+    response headers (connect_timeout + read_timeout), body (read_timeout),
+    and the whole site including the logo (timeout).
+    Blocking lookups and cache I/O run on io_executor, HTML parsing and image
+    conversion on cpu_executor (None = the loop's default executor).
+    """
+    start_time = time.time()
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    
+    domain = urlparse(url).netloc
+    company_name = domain.replace("www.", "").split(".")[0].title()
+    cache_stats = {}
+    result = {"company_name": company_name, "url": url, "logo_path": None, "logo_url": None, "error": None,
+              "cache": cache_stats}
+    
+    async def run():
+        loop = asyncio.get_running_loop()
         
-        # Quick image processing
+        # Step 1: DNS resolution with timeout
         try:
-            img = Image.open(BytesIO(response.content))
-            
-            # Convert to PNG with transparency
-            if img.mode != 'RGBA':
-                img = img.convert('RGBA')
+            if dns_cache is not None:
+                lookup = loop.run_in_executor(io_executor, dns_cache.resolve, urlparse(url).hostname)
+            else:
+                lookup = loop.run_in_executor(io_executor, _system_getaddrinfo, urlparse(url).hostname, None)
+            await asyncio.wait_for(lookup, dns_timeout)
+        except (socket.gaierror, asyncio.TimeoutError) as e:
+            result["error"] = f"DNS resolution failed: {str(e) or 'timeout'}"
+            return
+        
+        # Step 2: connect + headers, then body, each with its own deadline
+        scanner = LogoPageScanner(url, page_byte_budget) if page_byte_budget else None
+        body, encoding = await _fetch_body_async(
+            session, url, REQUEST_HEADERS, connect_timeout + read_timeout, read_timeout,
+            response_cache, cache_stats, body_stream=scanner, keep_partial=scanner is not None,
+            connect_timeout=connect_timeout, io_executor=io_executor, allow_redirects=True
+        )
+        result["page_bytes"] = len(body)
+        
+        # Step 3: parse off the event loop so other sites keep moving
+        # (the scanner has already ranked candidates unless the page came from cache)
+        if scanner is not None:
+            if scanner.candidates is None:
+                await loop.run_in_executor(cpu_executor, rescan_page, scanner, body, encoding)
+            candidates = scanner.candidates
+        else:
+            html = body.decode(encoding, errors='replace')
+            candidates = await loop.run_in_executor(cpu_executor, find_logo_candidates, html, url)
+        
+        # Step 4: download the best candidate that turns out to be an image
+        result["logo_path"], result["logo_url"] = await download_best_logo_async(
+            session, candidates, company_name, output_dir, logo_timeout, response_cache, cache_stats,
+            io_executor, cpu_executor
+        )
+    
+    try:
+        await asyncio.wait_for(run(), timeout)
+    except asyncio.TimeoutError:
+        if time.time() - start_time >= timeout:
+            result["error"] = f"Hard timeout after {time.time() - start_time:.1f}s - deadline exceeded"
+        else:
+            result["error"] = "Request timeout"
+    except aiohttp.ClientConnectionError:
+        result["error"] = "Connection error"
+    except Exception as e:
+        result["error"] = str(e)
+    
+    result["duration"] = time.time() - start_time
+    return result
+
+async def iter_scrape_async(urls, output_dir="bulletproof_logos", concurrency=100, timeout=15,
+                            dns_cache_path=None, http_cache_dir=None, parse_workers=None, **site_options):
+    """
+    Async generator yielding results in completion order, `concurrency` sites in flight.
+    
+    Blocking lookups and cache I/O get a private thread pool with one thread
+    per site in flight, so hung getaddrinfo calls only hold up their own
+    sites; parsing and image conversion share a small pool of
+    `parse_workers` threads (default: cores, up to 4).
+    """
+    if not AIOHTTP_AVAILABLE:
+        raise RuntimeError("aiohttp is required for the async engine. Install with: pip install aiohttp")
+    
+    concurrency = max(1, int(concurrency))
+    dns_cache = DNSCache(dns_cache_path) if dns_cache_path else None
+    response_cache = _http_sessions().get_response_cache(http_cache_dir) if http_cache_dir else None
+    io_executor = ThreadPoolExecutor(concurrency, thread_name_prefix="scrape-io")
+    cpu_executor = ThreadPoolExecutor(parse_workers or min(4, os.cpu_count() or 1), thread_name_prefix="scrape-cpu")
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(
+        limit=concurrency, limit_per_host=_http_sessions().POOL_PER_HOST, ssl=False,
+        resolver=CachedResolver(dns_cache, io_executor)
+    )
+    
+    try:
+        async with aiohttp.ClientSession(connector=connector) as session:
+            async def bounded(url):
+                async with semaphore:
+                    return await scrape_single_website_async(url, session, output_dir, timeout,
+                                                             dns_cache=dns_cache, response_cache=response_cache,
+                                                             io_executor=io_executor, cpu_executor=cpu_executor,
+                                                             **site_options)
             
-            # Resize if too large
-            if img.width > 800 or img.height > 800:
-                img.thumbnail((800, 800), Image.Resampling.LANCZOS)
+            tasks = [asyncio.ensure_future(bounded(url)) for url in urls]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    yield await next_done
+            finally:
+                for task in tasks:
+                    task.cancel()
+    finally:
+        # Don't wait on lookups that are still hung; their sites have already timed out
+        io_executor.shutdown(wait=False, cancel_futures=True)
+        cpu_executor.shutdown(wait=False, cancel_futures=True)
+
+def normalize_domain(url):
+    """Store key for a URL: lowercase host without scheme, port, 'www.' or trailing dot."""
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    host = (urlparse(url).hostname or '').rstrip('.')
+    return host[4:] if host.startswith('www.') else host
+
+def is_transient_error(error):
+    """True for failures worth retrying soon (timeouts, resets, 5xx/429, DNS SERVFAIL)."""
+    if not error:
+        return False
+    markers = ("timeout", "timed out", "connection error", "worker died", "no result",
+               "temporary failure", "try again")
+    lowered = error.lower()
+    return any(marker in lowered for marker in markers) or error[:3] in ("429", "500", "502", "503", "504")
+
+class LogoResultStore:
+    """
+    Per-domain record of the last scrape, in a SQLite file, so re-runs only
+    touch new, stale or retry-due domains.
+    
+    Solved domains (and permanent failures such as NXDOMAIN or "no logo")
+    are rechecked after `freshness_days`. Transient failures are retried
+    with exponential backoff from `retry_base` up to `retry_max` seconds.
+    """
+    
+    def __init__(self, path, freshness_days=30, retry_base=15 * 60, retry_max=24 * 3600):
+        self.path = path
+        self.freshness = freshness_days * 86400
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._conn = None
+    
+    def _db(self):
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS logo_results ("
+                "domain TEXT PRIMARY KEY, url TEXT, company_name TEXT, logo_url TEXT, logo_sha256 TEXT, "
+                "logo_path TEXT, error TEXT, attempts INTEGER, updated_at REAL, next_check_at REAL)"
+            )
+            self._conn = conn
+        return self._conn
+    
+    def get(self, url):
+        """Stored row for the URL's domain as a dict, or None."""
+        row = self._db().execute(
+            "SELECT domain, url, company_name, logo_url, logo_sha256, logo_path, error, attempts, updated_at, "
+            "next_check_at FROM logo_results WHERE domain = ?", (normalize_domain(url),)
+        ).fetchone()
+        if row is None:
+            return None
+        keys = ("domain", "url", "company_name", "logo_url", "logo_sha256", "logo_path", "error", "attempts",
+                "updated_at", "next_check_at")
+        return dict(zip(keys, row))
+    
+    def is_due(self, url, now=None):
+        """Whether the URL's domain should be scraped again."""
+        row = self.get(url)
+        if row is None:
+            return True
+        if row["logo_path"] and not os.path.exists(row["logo_path"]):
+            return True
+        return (now or time.time()) >= row["next_check_at"]
+    
+    def record(self, result):
+        """Save a scrape result and schedule the domain's next check."""
+        now = time.time()
+        previous = self.get(result["url"])
+        logo_path = result.get("logo_path")
+        logo_sha256 = None
+        if logo_path:
+            attempts = 0
+            next_check_at = now + self.freshness
+            try:
+                with open(logo_path, 'rb') as f:
+                    logo_sha256 = hashlib.sha256(f.read()).hexdigest()
+            except OSError:
+                pass
+        else:
+            attempts = (previous["attempts"] if previous else 0) + 1
+            if is_transient_error(result.get("error")):
+                next_check_at = now + min(self.retry_max, self.retry_base * 2 ** (attempts - 1))
+            else:
+                next_check_at = now + self.freshness
+        
+        conn = self._db()
+        conn.execute(
+            "INSERT OR REPLACE INTO logo_results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (normalize_domain(result["url"]), result["url"], result.get("company_name"), result.get("logo_url"),
+             logo_sha256, logo_path, result.get("error"), attempts, now, next_check_at)
+        )
+        conn.commit()
+    
+    def as_result(self, url):
+        """The stored row for the URL, shaped like a scrape result."""
+        row = self.get(url)
+        return {
+            "company_name": row["company_name"],
+            "url": url,
+            "logo_path": row["logo_path"],
+            "logo_url": row["logo_url"],
+            "error": row["error"],
+            "duration": 0.0,
+            "from_store": True,
+        }
+    
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+def persistent_scraper_worker(conn, output_dir="bulletproof_logos", timeout=15, dns_cache_path=None,
+                              http_cache_dir=None, page_byte_budget=PAGE_BYTE_BUDGET):
+    """
+    Long-lived worker loop: import the heavy modules once, then scrape
+    URLs received over `conn` until a None sentinel arrives.
+    """
+    import queue
+    import requests  # noqa: F401 - warm the import before the first task
+    from bs4 import BeautifulSoup  # noqa: F401
+    
+    while True:
+        try:
+            url = conn.recv()
+        except (EOFError, OSError):
+            break
+        if url is None:
+            break
+        
+        local_queue = queue.SimpleQueue()
+        scrape_single_website_isolated(url, local_queue, output_dir, timeout, dns_cache_path, http_cache_dir,
+                                       page_byte_budget)
+        try:
+            result = local_queue.get_nowait()
+        except queue.Empty:
+            result = {
+                "company_name": urlparse(url).netloc.replace("www.", "").split(".")[0].title(),
+                "url": url,
+                "logo_path": None,
+                "error": "Worker produced no result"
+            }
+        conn.send(result)
+
+class PersistentScraperPool:
+    """
+    Pre-forked pool of long-lived scraper processes.
+    
+    Each worker has a private pipe, so a worker that overruns its deadline
+    can be killed and replaced without disturbing the others.
+    """
+    
+    def __init__(self, workers=4, output_dir="bulletproof_output", per_site_timeout=15, dns_cache_path=None,
+                 http_cache_dir=None, page_byte_budget=PAGE_BYTE_BUDGET):
+        self.workers = max(1, int(workers))
+        self.output_dir = output_dir
+        self.per_site_timeout = per_site_timeout
+        self.dns_cache_path = dns_cache_path
+        self.http_cache_dir = http_cache_dir
+        self.page_byte_budget = page_byte_budget
+        self._slots = []
+        self.respawned = 0
+    
+    def __enter__(self):
+        self.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def start(self):
+        """Fork the workers (no-op if already running)."""
+        while len(self._slots) < self.workers:
+            self._slots.append(self._spawn())
+    
+    def _spawn(self):
+        parent_conn, child_conn = Pipe()
+        process = Process(
+            target=persistent_scraper_worker,
+            args=(child_conn, self.output_dir, self.per_site_timeout, self.dns_cache_path, self.http_cache_dir,
+                  self.page_byte_budget),
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        return {"process": process, "conn": parent_conn, "url": None, "start_time": None}
+    
+    def _replace(self, slot):
+        """Kill a worker and put a fresh one in its place."""
+        process = slot["process"]
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout=2)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        slot["conn"].close()
+        slot.update(self._spawn())
+        self.respawned += 1
+    
+    def iter_scrape(self, urls):
+        """
+        Yield results in completion order, enforcing the per-site deadline.
+        Workers still busy when the generator is closed early are replaced.
+        """
+        self.start()
+        pending = iter(urls)
+        exhausted = False
+        
+        try:
+            while True:
+                # Hand work to idle workers
+                for slot in self._slots:
+                    if exhausted or slot["url"] is not None:
+                        continue
+                    try:
+                        url = next(pending)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    logger.info(f"🎯 Scraping {url} with {self.per_site_timeout}s timeout")
+                    slot["url"], slot["start_time"] = url, time.time()
+                    slot["conn"].send(url)
             
-            img.save(filepath, 'PNG', optimize=True)
-            return filepath
+                busy = [slot for slot in self._slots if slot["url"] is not None]
+                if not busy:
+                    break
             
-        except Exception:
-            # Fallback: save raw data
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            return filepath
+                next_deadline = min(slot["start_time"] for slot in busy) + self.per_site_timeout
+                waitables = [slot["conn"] for slot in busy] + [slot["process"].sentinel for slot in busy]
+                ready = wait(waitables, timeout=max(0, next_deadline - time.time()))
             
-    except Exception as e:
-        logger.debug(f"Logo download failed: {str(e)}")
-        return None
+                now = time.time()
+                for slot in busy:
+                    url, start_time = slot["url"], slot["start_time"]
+                    result = None
+                    if slot["conn"] in ready:
+                        try:
+                            result = slot["conn"].recv()
+                        except (EOFError, OSError):
+                            result = None
+                
+                    if result is not None:
+                        result["duration"] = now - start_time
+                        if result.get("logo_path"):
+                            logger.info(f"✅ Logo found in {result['duration']:.1f}s: {result['logo_path']}")
+                        else:
+                            logger.warning(f"❌ No logo found in {result['duration']:.1f}s: {result.get('error', 'Unknown error')}")
+                    elif now - start_time >= self.per_site_timeout:
+                        logger.warning(f"⏱️ Worker timeout for {url}, replacing worker...")
+                        self._replace(slot)
+                        result = {
+                            "company_name": urlparse(url).netloc.replace("www.", "").split(".")[0].title(),
+                            "url": url,
+                            "logo_path": None,
+                            "error": f"Hard timeout after {now - start_time:.1f}s - worker killed",
+                            "duration": now - start_time
+                        }
+                    elif not slot["process"].is_alive() or slot["process"].sentinel in ready:
+                        self._replace(slot)
+                        result = {
+                            "company_name": urlparse(url).netloc.replace("www.", "").split(".")[0].title(),
+                            "url": url,
+                            "logo_path": None,
+                            "error": f"Worker died after {now - start_time:.1f}s",
+                            "duration": now - start_time
+                        }
+                    else:
+                        continue
+                
+                    slot["url"], slot["start_time"] = None, None
+                    yield result
+        finally:
+            # Abandoned early (break, exception, close()): jobs still in flight would
+            # answer the next iter_scrape call, so their workers are replaced
+            for slot in self._slots:
+                if slot["url"] is not None:
+                    self._replace(slot)
+    
+    def close(self):
+        """Stop all workers."""
+        for slot in self._slots:
+            try:
+                slot["conn"].send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for slot in self._slots:
+            slot["process"].join(timeout=2)
+            if slot["process"].is_alive():
+                slot["process"].kill()
+                slot["process"].join()
+            slot["conn"].close()
+        self._slots = []
 
 class BulletproofScraper:
     """
     Bulletproof scraper that never hangs by using process isolation.
     """
     
-    def __init__(self, output_dir="bulletproof_output", per_site_timeout=15):
+    def __init__(self, output_dir="bulletproof_output", per_site_timeout=15, workers=1, mode="fork",
+                 dns_cache=True, http_cache=True, page_byte_budget=PAGE_BYTE_BUDGET, result_store=True,
+                 freshness_days=30):
+        """
+        mode: "fork" starts a fresh process per URL; "persistent" reuses a
+        pre-forked PersistentScraperPool (scrape_website included) until close();
+        "async" runs every site on one event loop (workers = sites in flight).
+        dns_cache: share a DNSCache (output_dir/dns_cache.sqlite) across workers and runs.
+        http_cache: revalidate pages and logos from a ResponseCache in output_dir/http_cache.
+        page_byte_budget: stop reading a page once the logo is found or this many
+        bytes are read (None reads every page in full).
+        result_store: remember each domain's outcome in output_dir/logo_results.sqlite;
+        scrape_multiple skips domains solved within `freshness_days` and backs
+        off transient failures.
+        """
+        if mode not in ("fork", "persistent", "async"):
+            raise ValueError(f"Unknown scraper mode: {mode}")
         self.output_dir = output_dir
         self.per_site_timeout = per_site_timeout
+        self.workers = max(1, int(workers))
+        self.mode = mode
+        self.dns_cache_path = os.path.join(output_dir, "dns_cache.sqlite") if dns_cache else None
+        self.http_cache_dir = os.path.join(output_dir, "http_cache") if http_cache else None
+        self.page_byte_budget = page_byte_budget
+        self.result_store = (LogoResultStore(os.path.join(output_dir, "logo_results.sqlite"), freshness_days)
+                             if result_store else None)
+        self._pool = None
+        self.last_summary = None
         os.makedirs(output_dir, exist_ok=True)
+    
+    def close(self):
+        """Shut down the persistent worker pool, if one was started."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+        if self.result_store is not None:
+            self.result_store.close()
         
     def scrape_website(self, url):
         """
         Scrape a website with bulletproof timeout protection.
         Uses process isolation to prevent hanging.
         """
+        if self.mode != "fork":
+            return next(self.iter_scrape([url]))
+        
         logger.info(f"🎯 Scraping {url} with {self.per_site_timeout}s timeout")
         
+        process, result_queue, start_time = self._start_site(url)
+        
+        # Wait for the process to complete or timeout
+        process.join(timeout=self.per_site_timeout)
+        
+        return self._finish_site(url, process, result_queue, start_time)
+    
+    def _start_site(self, url):
+        """Start the isolated scraping process for one URL."""
         # Create a queue for the result
         result_queue = Queue()
         
         # Start the scraping process
         process = Process(
             target=scrape_single_website_isolated,
-            args=(url, result_queue, self.output_dir, self.per_site_timeout)
+            args=(url, result_queue, self.output_dir, self.per_site_timeout, self.dns_cache_path,
+                  self.http_cache_dir, self.page_byte_budget)
         )
         
         start_time = time.time()
         process.start()
-        
-        # Wait for the process to complete or timeout
-        process.join(timeout=self.per_site_timeout)
-        
+        return process, result_queue, start_time
+    
+    def _finish_site(self, url, process, result_queue, start_time):
+        """Kill the site's process if it is still running and collect its result."""
         if process.is_alive():
             # Process is still running - kill it
             logger.warning(f"⏱️ Process timeout for {url}, terminating...")
@@ -275,25 +1480,188 @@ class BulletproofScraper:
                 "duration": duration
             }
     
-    def scrape_multiple(self, urls):
-        """Scrape multiple URLs with progress tracking."""
-        results = []
+    def iter_scrape(self, urls, workers=None):
+        """
+        Scrape URLs with up to `workers` isolated processes in flight.
+        Yields each result as soon as its site finishes (completion order).
+        Every site keeps its own hard timeout and is killed when it overruns.
+        """
+        workers = max(1, int(workers or self.workers))
+        if self.mode == "persistent":
+            if self._pool is None or self._pool.workers != workers:
+                self.close()
+                self._pool = PersistentScraperPool(workers, self.output_dir, self.per_site_timeout,
+                                                   self.dns_cache_path, self.http_cache_dir,
+                                                   self.page_byte_budget)
+            yield from self._pool.iter_scrape(urls)
+            return
+        if self.mode == "async":
+            yield from self._iter_scrape_async(urls, workers)
+            return
         
-        for i, url in enumerate(urls, 1):
-            logger.info(f"🔄 [{i}/{len(urls)}] Processing {url}")
+        pending = iter(urls)
+        active = {}  # process sentinel -> (url, process, result_queue, start_time)
+        exhausted = False
+        
+        while active or not exhausted:
+            # Top up the pool
+            while not exhausted and len(active) < workers:
+                try:
+                    url = next(pending)
+                except StopIteration:
+                    exhausted = True
+                    break
+                logger.info(f"🎯 Scraping {url} with {self.per_site_timeout}s timeout")
+                process, result_queue, start_time = self._start_site(url)
+                active[process.sentinel] = (url, process, result_queue, start_time)
             
-            start_time = time.time()
-            result = self.scrape_website(url)
+            if not active:
+                break
             
-            results.append(result)
+            # Sleep until a process exits or the earliest deadline passes
+            next_deadline = min(entry[3] for entry in active.values()) + self.per_site_timeout
+            ready = wait(list(active), timeout=max(0, next_deadline - time.time()))
             
-            # Progress update
-            if i % 10 == 0:
-                success_count = sum(1 for r in results if r.get('logo_path'))
-                avg_time = sum(r.get('duration', 0) for r in results) / len(results)
-                logger.info(f"📊 Progress: {i}/{len(urls)} ({i/len(urls)*100:.1f}%) - {success_count} logos found - Avg: {avg_time:.1f}s/site")
+            now = time.time()
+            for sentinel in list(active):
+                url, process, result_queue, start_time = active[sentinel]
+                if sentinel in ready or now - start_time >= self.per_site_timeout:
+                    del active[sentinel]
+                    if sentinel in ready:
+                        # Sentinel fires at exit, just before the child can be reaped
+                        process.join(timeout=2)
+                    yield self._finish_site(url, process, result_queue, start_time)
+    
+    def _iter_scrape_async(self, urls, workers):
+        """Drive iter_scrape_async from synchronous code, one result at a time."""
+        agen = iter_scrape_async(urls, self.output_dir, concurrency=workers, timeout=self.per_site_timeout,
+                                 dns_cache_path=self.dns_cache_path, http_cache_dir=self.http_cache_dir,
+                                 page_byte_budget=self.page_byte_budget)
+        loop = asyncio.new_event_loop()
+        try:
+            while True:
+                try:
+                    result = loop.run_until_complete(agen.__anext__())
+                except StopAsyncIteration:
+                    break
+                if result.get("logo_path"):
+                    logger.info(f"✅ Logo found in {result['duration']:.1f}s: {result['logo_path']}")
+                else:
+                    logger.warning(f"❌ No logo found in {result['duration']:.1f}s: {result.get('error', 'Unknown error')}")
+                yield result
+        finally:
+            loop.run_until_complete(agen.aclose())
+            loop.close()
+    
+    def scrape_multiple(self, urls, workers=None, force=False):
+        """
+        Scrape multiple URLs with progress tracking.
+        With workers > 1 sites run in a bounded pool and results are
+        returned in completion order rather than input order.
+        Domains the result store says are not due come back first, marked
+        `from_store`; force=True scrapes everything.
+        """
+        workers = max(1, int(workers or self.workers))
+        results = []
         
+        if self.result_store is not None and not force:
+            due = []
+            for url in urls:
+                if self.result_store.is_due(url):
+                    due.append(url)
+                else:
+                    results.append(self.result_store.as_result(url))
+            if results:
+                logger.info(f"💾 {len(results)} domains fresh in result store, scraping {len(due)}")
+            urls = due
+        skipped = len(results)
+        
+        if workers > 1 or self.mode != "fork":
+            logger.info(f"🚀 Scraping {len(urls)} sites with {workers} {self.mode} workers")
+            for result in self.iter_scrape(urls, workers):
+                self._record(result)
+                results.append(result)
+                self._log_progress(results[skipped:], len(urls))
+        else:
+            for i, url in enumerate(urls, 1):
+                logger.info(f"🔄 [{i}/{len(urls)}] Processing {url}")
+                
+                result = self.scrape_website(url)
+                self._record(result)
+                
+                results.append(result)
+                self._log_progress(results[skipped:], len(urls))
+        
+        self.last_summary = summarize_results(results)
+        summary = self.last_summary
+        logger.info(f"🏁 Done: {summary['logos_found']}/{summary['sites']} logos ({summary['from_store']} from store) - "
+                    f"Avg: {summary['avg_time']:.1f}s/site - "
+                    f"HTTP cache: {summary['cache_hits']} hits, {summary['cache_misses']} misses, "
+                    f"{summary['cache_revalidations']} revalidations - Avg page: {summary['avg_page_bytes'] / 1024:.0f} KB")
         return results
+    
+    def _record(self, result):
+        if self.result_store is not None:
+            try:
+                self.result_store.record(result)
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Could not record result for {result.get('url')}: {e}")
+    
+    def _log_progress(self, results, total):
+        """Log rolling stats every 10 completed sites."""
+        i = len(results)
+        if i % 10 == 0:
+            summary = summarize_results(results)
+            logger.info(f"📊 Progress: {i}/{total} ({i/total*100:.1f}%) - {summary['logos_found']} logos found - "
+                        f"Avg: {summary['avg_time']:.1f}s/site - Cache hits: {summary['cache_hits']}")
+
+def summarize_results(results):
+    """Aggregate run stats, including HTTP cache counters reported by each site."""
+    scraped = [r for r in results if not r.get('from_store')]
+    summary = {
+        "sites": len(results),
+        "from_store": len(results) - len(scraped),
+        "logos_found": sum(1 for r in results if r.get('logo_path')),
+        "avg_time": sum(r.get('duration', 0) for r in scraped) / max(1, len(scraped)),
+        "cache_hits": 0,
+        "cache_misses": 0,
+        "cache_revalidations": 0,
+        "avg_page_bytes": sum(r.get('page_bytes', 0) for r in scraped) / max(1, len(scraped)),
+    }
+    for r in results:
+        cache = r.get("cache") or {}
+        summary["cache_hits"] += cache.get("hits", 0)
+        summary["cache_misses"] += cache.get("misses", 0)
+        summary["cache_revalidations"] += cache.get("revalidations", 0)
+    return summary
+
+def compare_scrape_modes(urls, workers=4, per_site_timeout=15, output_dir="bulletproof_output"):
+    """
+    Run the same URL list through fork-per-URL and persistent workers and
+    report wall time and throughput for each.
+    
+    Each mode starts cold in its own output_dir/<mode> with the result store,
+    DNS and HTTP caches off, so neither run is served from the other's work.
+    """
+    report = {}
+    for mode in ("fork", "persistent"):
+        scraper = BulletproofScraper(output_dir=os.path.join(output_dir, mode), per_site_timeout=per_site_timeout,
+                                     workers=workers, mode=mode, result_store=False, dns_cache=False,
+                                     http_cache=False)
+        start_time = time.time()
+        try:
+            results = scraper.scrape_multiple(urls)
+        finally:
+            scraper.close()
+        total_time = time.time() - start_time
+        report[mode] = {
+            "total_time": total_time,
+            "sites_per_sec": len(urls) / total_time if total_time else 0.0,
+            "avg_site_time": sum(r.get("duration", 0) for r in results) / max(1, len(results)),
+            "logos_found": sum(1 for r in results if r.get("logo_path")),
+        }
+        logger.info(f"⏱️ {mode}: {total_time:.1f}s total, {report[mode]['sites_per_sec']:.2f} sites/s")
+    return report
 
 def test_bulletproof_scraper():
     """Test the bulletproof scraper with known problematic and good sites."""
@@ -0,0 +1,266 @@
+"""
+Shared keep-alive HTTP sessions.
+
+One pooled requests.Session per process and thread, used by the scraper
+(page + logo fetch) and the mockup builder (logo, base images, Airtable).
+Connections to a host are reused, capped per host, and every request
+still carries a strict timeout. ResponseCache adds an on-disk body cache
+revalidated with ETag/Last-Modified.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+POOL_HOSTS = 32          # distinct hosts kept in the pool
+POOL_PER_HOST = 4        # max kept-alive connections per host
+DEFAULT_TIMEOUT = (2, 8)  # connect, read - used when a caller passes none
+
+
+class TimeoutSession(requests.Session):
+    """requests.Session that never issues a request without a timeout."""
+
+    def __init__(self, default_timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.default_timeout = default_timeout
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.default_timeout
+        return super().request(method, url, **kwargs)
+
+
+def build_session(pool_hosts=POOL_HOSTS, per_host=POOL_PER_HOST, default_timeout=DEFAULT_TIMEOUT):
+    """Create a keep-alive session with a bounded connection pool per host."""
+    session = TimeoutSession(default_timeout)
+    # No retries: a retry would silently double the caller's timeout budget.
+    # No pool_block: urllib3 would wait for a free connection without any timeout.
+    adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=per_host, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_local = threading.local()
+
+
+def get_session():
+    """Return this thread's shared session (rebuilt after fork so sockets are never shared)."""
+    session = getattr(_local, "session", None)
+    if session is None or getattr(_local, "pid", None) != os.getpid():
+        session = build_session()
+        _local.session, _local.pid = session, os.getpid()
+    return session
+
+
+def close_session():
+    """Close this thread's session, if any."""
+    session = getattr(_local, "session", None)
+    if session is not None:
+        session.close()
+        _local.session = None
+
+
+class ResponseCache:
+    """
+    On-disk HTTP body cache keyed by URL and revalidated with conditional GETs.
+
+    Bodies are stored content-addressed (sha256) under root/objects with their
+    ETag/Last-Modified validators in root/index.sqlite. Once the stored bytes
+    pass max_bytes, least-recently-used entries are evicted. An entry can be
+    `partial` (the prefix a streaming reader stopped at); only callers that
+    ask for keep_partial are served those.
+    """
+
+    def __init__(self, root, max_bytes=256 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._conn_pid = None
+        self._lock = threading.Lock()
+
+    def _db(self):
+        # Reopen after fork: SQLite connections must not cross processes
+        if self._conn is None or self._conn_pid != os.getpid():
+            os.makedirs(os.path.join(self.root, "objects"), exist_ok=True)
+            conn = sqlite3.connect(os.path.join(self.root, "index.sqlite"), timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "url TEXT PRIMARY KEY, sha256 TEXT, size INTEGER, etag TEXT, last_modified TEXT, "
+                "content_type TEXT, final_url TEXT, last_access REAL, partial INTEGER DEFAULT 0)"
+            )
+            try:
+                conn.execute("ALTER TABLE responses ADD COLUMN partial INTEGER DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass  # column already there
+            self._conn, self._conn_pid = conn, os.getpid()
+        return self._conn
+
+    def _object_path(self, sha256):
+        return os.path.join(self.root, "objects", sha256[:2], sha256)
+
+    def lookup(self, url):
+        """Cached entry for url as a dict, or None."""
+        try:
+            with self._lock:
+                row = self._db().execute(
+                    "SELECT sha256, size, etag, last_modified, content_type, final_url, partial "
+                    "FROM responses WHERE url = ?",
+                    (url,)
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None or not os.path.exists(self._object_path(row[0])):
+            return None
+        keys = ("sha256", "size", "etag", "last_modified", "content_type", "final_url", "partial")
+        entry = dict(zip(keys, row))
+        entry["partial"] = bool(entry["partial"])
+        return entry
+
+    @staticmethod
+    def conditional_headers(entry):
+        """If-None-Match / If-Modified-Since headers for a cached entry."""
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def read_body(self, url, entry):
+        """Return the cached body and mark the entry as recently used."""
+        try:
+            with open(self._object_path(entry["sha256"]), "rb") as f:
+                body = f.read()
+        except OSError:
+            return None
+        try:
+            with self._lock:
+                conn = self._db()
+                conn.execute("UPDATE responses SET last_access = ? WHERE url = ?", (time.time(), url))
+                conn.commit()
+        except sqlite3.Error:
+            pass
+        return body
+
+    def store(self, url, headers, body, final_url=None, partial=False):
+        """Store a 200 body (or, with partial, the prefix read of one) if the server gave us a validator."""
+        etag, last_modified = headers.get("ETag"), headers.get("Last-Modified")
+        if not (etag or last_modified) or len(body) > self.max_bytes:
+            return
+        sha256 = hashlib.sha256(body).hexdigest()
+        path = self._object_path(sha256)
+        try:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(body)
+                os.replace(tmp_path, path)
+            with self._lock:
+                conn = self._db()
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (url, sha256, len(body), etag, last_modified, headers.get("Content-Type"),
+                     final_url or url, time.time(), int(partial))
+                )
+                conn.commit()
+                self._evict(conn)
+        except (OSError, sqlite3.Error):
+            pass
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT sha256, size FROM responses)").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for url, sha256, size in conn.execute(
+                "SELECT url, sha256, size FROM responses ORDER BY last_access").fetchall():
+            conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+            if not conn.execute("SELECT 1 FROM responses WHERE sha256 = ? LIMIT 1", (sha256,)).fetchone():
+                try:
+                    os.remove(self._object_path(sha256))
+                except OSError:
+                    pass
+                total -= size
+            if total <= self.max_bytes:
+                break
+        conn.commit()
+
+    def get(self, session, url, stats=None, read_body=None, keep_partial=False, **kwargs):
+        """
+        session.get() through the cache. A 304 is answered from disk as a 200
+        Response. `stats` (dict) counts hits, misses and revalidations.
+        read_body(response) -> bytes, if given, streams a 200 body instead of
+        reading response.content (so callers can enforce size caps). If it
+        stops early it sets response.partial, and the body is only cached
+        (as a partial entry) with keep_partial - for readers whose early stop
+        means "found what I need", not "rejected".
+        """
+        stats = stats if stats is not None else {}
+        entry = self.lookup(url)
+        if entry and entry["partial"] and not keep_partial:
+            entry = None
+        headers = dict(kwargs.pop("headers", None) or {})
+        if entry:
+            headers.update(self.conditional_headers(entry))
+            stats["revalidations"] = stats.get("revalidations", 0) + 1
+
+        kwargs.pop("stream", None)
+        response = session.get(url, headers=headers, stream=read_body is not None, **kwargs)
+
+        if response.status_code == 304 and entry:
+            body = self.read_body(url, entry)
+            if body is not None:
+                stats["hits"] = stats.get("hits", 0) + 1
+                response.close()
+                return cached_response(url, entry, body)
+
+        stats["misses"] = stats.get("misses", 0) + 1
+        if response.status_code == 200:
+            if read_body is not None:
+                read_into(response, read_body)
+            partial = getattr(response, "partial", False)
+            if keep_partial or not partial:
+                self.store(url, response.headers, response.content, response.url, partial)
+        return response
+
+
+def read_into(response, read_body):
+    """Fill response.content from read_body(response), closing the connection on failure."""
+    try:
+        response._content = read_body(response)
+    except Exception:
+        response.close()
+        raise
+    return response
+
+
+def cached_response(url, entry, body):
+    """Build a 200 requests.Response for a body served from ResponseCache."""
+    response = requests.Response()
+    response.status_code = 200
+    response.url = entry.get("final_url") or url
+    response._content = body
+    response.partial = bool(entry.get("partial"))
+    if entry.get("content_type"):
+        response.headers["Content-Type"] = entry["content_type"]
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    return response
+
+
+_response_caches = {}
+
+
+def get_response_cache(root, max_bytes=256 * 1024 * 1024):
+    """Per-process ResponseCache for `root`."""
+    cache = _response_caches.get((root, os.getpid()))
+    if cache is None:
+        cache = ResponseCache(root, max_bytes)
+        _response_caches[(root, os.getpid())] = cache
+    return cache
@@ -27,7 +27,11 @@ const CONFIG = {
     .split(',')
     .map(s => s.trim().toUpperCase())
   ,
-  AIRTABLE_ENABLE_MOCKUP_FIELDS: String(process.env.AIRTABLE_ENABLE_MOCKUP_FIELDS || '').toLowerCase() === 'true'
+  AIRTABLE_ENABLE_MOCKUP_FIELDS: String(process.env.AIRTABLE_ENABLE_MOCKUP_FIELDS || '').toLowerCase() === 'true',
+  // Keep warm Python mockup workers instead of spawning a process per request
+  MOCKUP_WORKER: String(process.env.MOCKUP_WORKER || '').toLowerCase() === 'true',
+  MOCKUP_WORKERS: Math.max(1, parseInt(process.env.MOCKUP_WORKERS || '2', 10) || 2),
+  MOCKUP_JOB_TIMEOUT_MS: parseInt(process.env.MOCKUP_JOB_TIMEOUT_MS || '120000', 10) || 120000
 };
 
 // Import AWS SDK for S3 operations
@@ -1913,6 +1917,101 @@ app.get('/api/customer/:email/logo', async (req, res) => {
   }
 });
 
+function resolvePythonCommand() {
+  const isWindows = process.platform === 'win32';
+  // Prefer project venv python if available
+  const venvPython = isWindows
+    ? path.join(__dirname, '.venv', 'Scripts', 'python.exe')
+    : path.join(__dirname, '.venv', 'bin', 'python3');
+  if (fs.existsSync(venvPython)) return { cmd: venvPython, prefixArgs: [] };
+  return { cmd: isWindows ? 'py' : 'python3', prefixArgs: isWindows ? ['-3'] : [] };
+}
+
+/**
+ * Persistent mockup workers (CONFIG.MOCKUP_WORKER):
+ * - A pool of CONFIG.MOCKUP_WORKERS `build_mockups_from_airtable.py --serve` processes, each started on first use
+ * - Jobs go in as JSON lines on stdin; each gets one JSON reply line with its manifest
+ * - A worker runs its jobs one at a time, so each job goes to the worker with the fewest pending jobs;
+ *   requests beyond the pool size queue behind a running job
+ * - Interpreter, imports, HTTP/S3 clients and decoded base images stay warm between requests
+ * - A job still running after CONFIG.MOCKUP_JOB_TIMEOUT_MS kills its worker; that worker's pending
+ *   jobs fail and its next job starts a fresh process
+ */
+class MockupWorker {
+  constructor(index) {
+    this.index = index;
+    this.proc = null;
+    this.buffer = '';
+    this.pending = new Map();
+  }
+
+  start() {
+    const { cmd, prefixArgs } = resolvePythonCommand();
+    const scriptPath = path.join(__dirname, 'python', 'build_mockups_from_airtable.py');
+    const proc = spawn(cmd, [...prefixArgs, scriptPath, '--serve'], { stdio: ['pipe', 'pipe', 'pipe'], env: process.env });
+    proc.stdout.on('data', (d) => {
+      this.buffer += d.toString();
+      let nl;
+      while ((nl = this.buffer.indexOf('\n')) >= 0) {
+        const line = this.buffer.slice(0, nl).trim();
+        this.buffer = this.buffer.slice(nl + 1);
+        if (line) this.handleReply(line);
+      }
+    });
+    proc.stderr.on('data', (d) => process.stderr.write(d));
+    proc.stdin.on('error', () => {}); // a dead worker is handled by 'exit'
+    proc.on('exit', (code, signal) => this.stop(proc, `exit ${code ?? signal}`));
+    proc.on('error', (e) => this.stop(proc, e.message));
+    this.proc = proc;
+  }
+
+  stop(proc, reason) {
+    if (this.proc !== proc) return;
+    console.warn(`Mockup worker ${this.index} stopped: ${reason}`);
+    for (const job of this.pending.values()) {
+      clearTimeout(job.timer);
+      job.reject(new Error(`mockup worker stopped: ${reason}`));
+    }
+    this.pending.clear();
+    this.proc = null;
+    this.buffer = '';
+    proc.kill('SIGKILL');
+  }
+
+  handleReply(line) {
+    let reply;
+    try { reply = JSON.parse(line); }
+    catch (e) { return console.error('Mockup worker sent invalid JSON:', line); }
+    const job = this.pending.get(reply.id);
+    if (!job) return;
+    clearTimeout(job.timer);
+    this.pending.delete(reply.id);
+    if (reply.ok) job.resolve(reply.manifest);
+    else job.reject(new Error(reply.error || 'mockup job failed'));
+  }
+
+  run(id, job, timeoutMs) {
+    if (!this.proc) this.start();
+    const proc = this.proc;
+    return new Promise((resolve, reject) => {
+      // The deadline covers time queued behind this worker's earlier jobs too
+      const timer = setTimeout(() => this.stop(proc, `job ${id} timed out after ${timeoutMs}ms`), timeoutMs);
+      this.pending.set(id, { resolve, reject, timer });
+      proc.stdin.write(JSON.stringify({ id, ...job }) + '\n');
+    });
+  }
+}
+
+const mockupWorkers = {
+  workers: Array.from({ length: CONFIG.MOCKUP_WORKERS }, (_, i) => new MockupWorker(i)),
+  nextId: 1,
+
+  run(job) {
+    const worker = this.workers.reduce((best, w) => (w.pending.size < best.pending.size ? w : best));
+    return worker.run(this.nextId++, job, CONFIG.MOCKUP_JOB_TIMEOUT_MS);
+  }
+};
+
 /**
  * Generate mockup for a single product:
  * - Upload base image to S3 as placeholder
@@ -1990,25 +2089,49 @@ app.post('/api/products/:id/mockup', async (req, res) => {
       console.warn(`Base image not on disk (${p.imageFile}); using public URL fallback.`);
     }
 
+    const sendManifest = (manifest) => {
+      // Airtable removed: skip updating external tables
+      const nowIso = new Date().toISOString();
+      const imageFile = p.imageFile;
+      const pm = (manifest.product_map && manifest.product_map[imageFile]) || {};
+      const pngUrl = (pm.png_urls && pm.png_urls[0]) || placeholderBaseUrl;
+      const pdfUrl = (pm.pdf_urls && pm.pdf_urls[0]) || null;
+      const previewUrl = (pm.preview_urls && pm.preview_urls[0]) || null;
+
+
+      res.json({
+        ok: true,
+        placeholder_base_url: placeholderBaseUrl,
+        mockup: { pngUrl, pdfUrl, previewUrl },
+        chosen_logo_url: logoUrl,
+        manifest
+      });
+    };
+
     // 2) Run Python generator (it will also upload mockups and can fetch the base image if missing)
+    const productsDir = path.join(__dirname, 'public', 'images', 'products');
+    if (CONFIG.MOCKUP_WORKER) {
+      let manifest;
+      try {
+        manifest = await mockupWorkers.run({ email, logo_url: logoUrl, products_dir: productsDir, product_id: productId });
+      } catch (e) {
+        console.error('mockup worker error:', e.message);
+        return res.status(500).json({ error: `mockup generation failed: ${e.message}` });
+      }
+      return sendManifest(manifest);
+    }
+
     const scriptPath = path.join(__dirname, 'python', 'build_mockups_from_airtable.py'); // legacy script name; Airtable no longer used
     const args = [
       scriptPath,
       '--email', email,
       '--logo_url', logoUrl,
-      '--products_dir', path.join(__dirname, 'public', 'images', 'products'),
+      '--products_dir', productsDir,
       '--product_id', productId
     ];
     let pyStdout = '';
     let pyStderr = '';
-    const isWindows = process.platform === 'win32';
-    // Prefer project venv python if available
-    const venvPython = isWindows
-      ? path.join(__dirname, '.venv', 'Scripts', 'python.exe')
-      : path.join(__dirname, '.venv', 'bin', 'python3');
-    const hasVenvPython = fs.existsSync(venvPython);
-    const pythonCmd = hasVenvPython ? venvPython : (isWindows ? 'py' : 'python3');
-    const pythonPrefixArgs = hasVenvPython ? [] : (isWindows ? ['-3'] : []);
+    const { cmd: pythonCmd, prefixArgs: pythonPrefixArgs } = resolvePythonCommand();
     const py = spawn(pythonCmd, [...pythonPrefixArgs, ...args], { stdio: ['ignore', 'pipe', 'pipe'], env: process.env });
     py.stdout.on('data', (d) => { pyStdout += d.toString(); });
     py.stderr.on('data', (d) => { pyStderr += d.toString(); });
@@ -2025,22 +2148,7 @@ app.post('/api/products/:id/mockup', async (req, res) => {
         return res.status(500).json({ error: 'Invalid manifest from generator' });
       }
 
-      // Airtable removed: skip updating external tables
-      const nowIso = new Date().toISOString();
-      const imageFile = p.imageFile;
-      const pm = (manifest.product_map && manifest.product_map[imageFile]) || {};
-      const pngUrl = (pm.png_urls && pm.png_urls[0]) || placeholderBaseUrl;
-      const pdfUrl = (pm.pdf_urls && pm.pdf_urls[0]) || null;
-      const previewUrl = (pm.preview_urls && pm.preview_urls[0]) || null;
-
-
-      res.json({
-        ok: true,
-        placeholder_base_url: placeholderBaseUrl,
-        mockup: { pngUrl, pdfUrl, previewUrl },
-        chosen_logo_url: logoUrl,
-        manifest
-      });
+      sendManifest(manifest);
     });
   } catch (e) {
     console.error('mockup error:', e);